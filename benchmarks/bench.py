@@ -0,0 +1,168 @@
+'''Synthetic-corpus benchmarks for the parse, activate and render phases.
+
+Generates a project of annotated source files and output templates, then
+times State.parse_blocks, State.activate_blocks_from_templates and
+State.render_blocks_from_templates separately. Results can be saved as a
+baseline and later runs compared against it:
+
+    python benchmarks/bench.py --files 200 --save-baseline baseline.json
+    python benchmarks/bench.py --files 200 --baseline baseline.json
+'''
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+import collections
+
+import slugify
+
+sys.path.insert( 0, os.path.join( os.path.dirname( os.path.abspath(__file__) ), '..' ) )
+from illiterally.state import State
+from illiterally.block import BlockReader
+from illiterally.log import ERROR
+
+EMOJI_DELIMITERS = ('\U0001F525','\U0001F9EF')
+TEXT_DELIMITERS  = ('<<<:',':>>>')
+
+def generate_corpus( root: str, files: int=100, lines: int=200, depth: int=2, blocks: int=4, text_delimiters: bool=False, duplicate_rate: float=0.0, templates: int=4, seed: int=0 ):
+    '''Writes sources/ and templates/ under root and returns (source_files,template_files,total_lines)'''
+    rng = random.Random( seed )
+    left,right = TEXT_DELIMITERS if text_delimiters else EMOJI_DELIMITERS
+    top_level = []
+    source_files = []
+    total_lines = 0
+    os.makedirs( os.path.join( root, 'sources' ), exist_ok=True )
+    os.makedirs( os.path.join( root, 'templates' ), exist_ok=True )
+
+    def write_block( out, name: str, level: int, budget: int ):
+        out.append( f'// {left} {name}\n' )
+        body = max( 1, budget // (2 if level < depth else 1) )
+        out.extend( f'    value_{i} = compute( value_{i-1}, {i} ); // line {i}\n' for i in range(body) )
+        if level < depth:
+            write_block( out, f'{name} child', level+1, budget-body )
+        out.append( f'// {right}\n' )
+
+    for f in range(files):
+        out = []
+        filename = os.path.join( root, 'sources', f'source_{f:05d}.cpp' )
+        per_block = max( 1, lines // max(1,blocks) - 2 )
+        for b in range(blocks):
+            # shared names collide across files and exercise de-duplication
+            name = f'Common block {b}' if rng.random() < duplicate_rate else f'Block {f} {b}'
+            top_level.append( (filename,name) )
+            write_block( out, name, 1, per_block )
+            out.append( '\n' )
+        with open( filename, 'w' ) as fh:
+            fh.writelines( out )
+        source_files.append( filename )
+        total_lines += len(out)
+
+    # top-level blocks are rendered round-robin into the templates
+    counts = collections.Counter( name for _,name in top_level )
+    slugs = [ slugify.slugify(name) if counts[name] == 1 else BlockReader.dedup_slug( filename, slugify.slugify(name) ) for filename,name in top_level ]
+    template_files = []
+    for t in range(templates):
+        filename = os.path.join( root, 'templates', f'output_{t:03d}.md' )
+        with open( filename, 'w' ) as fh:
+            fh.write( "{% import 'macros.md.inc' as macros with context %}\n" )
+            fh.write( f'# Output {t}\n' )
+            fh.writelines( f"{{{{ macros.render('{slug}') }}}}\n" for slug in slugs[t::templates] )
+        template_files.append( filename )
+    return source_files, template_files, total_lines
+
+def run_phases( source_files, template_files, output_dir: str, text_delimiters: bool, jobs: int, track_memory: bool ):
+    '''Runs one build returning {phase: (seconds, peak_bytes)}'''
+    left,right = TEXT_DELIMITERS if text_delimiters else (None,None)
+    S = State( source_files=source_files, template_files=template_files, block_template='block.md', output_dir=output_dir, left=left, right=right, jobs=jobs, log_level=ERROR )
+    results = {}
+
+    def phase( name, fn ):
+        if track_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        ret = fn()
+        elapsed = time.perf_counter() - start
+        peak = 0
+        if track_memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        results[name] = (elapsed,peak)
+        return ret
+
+    blocks,_ = phase( 'parse', S.parse_blocks )
+    phase( 'activate', lambda: S.activate_blocks_from_templates( blocks ) )
+    phase( 'render',   lambda: S.render_blocks_from_templates( blocks ) )
+    return results
+
+def main( argv=sys.argv ):
+    parser = argparse.ArgumentParser('bench')
+    parser.add_argument( '--files',           type=int,   default=100,  help='Number of source files' )
+    parser.add_argument( '--lines',           type=int,   default=200,  help='Lines per source file' )
+    parser.add_argument( '--blocks',          type=int,   default=4,    help='Top-level blocks per source file' )
+    parser.add_argument( '--depth',           type=int,   default=2,    help='Block nesting depth' )
+    parser.add_argument( '--templates',       type=int,   default=4,    help='Number of output templates' )
+    parser.add_argument( '--duplicate-rate',  type=float, default=0.0,  help='Fraction of top-level block names shared between files' )
+    parser.add_argument( '--text-delimiters', action='store_true',      help='Use <<<: and :>>> instead of emoji delimiters' )
+    parser.add_argument( '--jobs',            type=int,   default=1,    help='Worker processes passed to State' )
+    parser.add_argument( '--repeat',          type=int,   default=3,    help='Timed runs, the fastest is reported' )
+    parser.add_argument( '--seed',            type=int,   default=0,    help='Random seed for the generator' )
+    parser.add_argument( '--save-baseline',   type=str,   default=None, help='Write results to this JSON file' )
+    parser.add_argument( '--baseline',        type=str,   default=None, help='Compare results against this JSON file' )
+    parser.add_argument( '--tolerance',       type=float, default=0.10, help='Allowed slowdown relative to the baseline' )
+    args = parser.parse_args( argv[1:] )
+
+    root = tempfile.mkdtemp( prefix='illiterally-bench-' )
+    try:
+        source_files,template_files,total_lines = generate_corpus(
+            root, files=args.files, lines=args.lines, depth=args.depth, blocks=args.blocks,
+            text_delimiters=args.text_delimiters, duplicate_rate=args.duplicate_rate,
+            templates=args.templates, seed=args.seed
+        )
+
+        # timings come from untraced runs, peak memory from one traced run
+        times = {}
+        for r in range(args.repeat):
+            for name,(elapsed,_) in run_phases( source_files, template_files, os.path.join(root,'output'), args.text_delimiters, args.jobs, False ).items():
+                times[name] = min( times.get(name,elapsed), elapsed )
+        memory = run_phases( source_files, template_files, os.path.join(root,'output'), args.text_delimiters, args.jobs, True )
+    finally:
+        shutil.rmtree( root, ignore_errors=True )
+
+    results = dict(
+        config = { k: v for k,v in vars(args).items() if k not in ['save_baseline','baseline','tolerance','repeat'] },
+        lines  = total_lines,
+        phases = { name: dict( seconds=times[name], lines_per_second=total_lines/max(times[name],1e-9), peak_bytes=memory[name][1] ) for name in times }
+    )
+
+    print(f'{total_lines} lines in {args.files} files, {args.templates} templates')
+    print(f'{"phase":<10}{"seconds":>12}{"lines/s":>14}{"peak MB":>10}')
+    for name,p in results['phases'].items():
+        print(f'{name:<10}{p["seconds"]:>12.4f}{p["lines_per_second"]:>14.0f}{p["peak_bytes"]/2**20:>10.1f}')
+
+    if args.save_baseline:
+        with open( args.save_baseline, 'w' ) as f:
+            json.dump( results, f, indent=2 )
+
+    ret = 0
+    if args.baseline:
+        with open( args.baseline ) as f:
+            baseline = json.load( f )
+        if baseline['config'] != results['config']:
+            print('Warning: baseline was recorded with a different configuration.')
+        for name,p in results['phases'].items():
+            if name not in baseline['phases']:
+                continue
+            ratio = p['seconds'] / max( baseline['phases'][name]['seconds'], 1e-9 )
+            status = 'REGRESSION' if ratio > 1.0 + args.tolerance else 'ok'
+            print(f'{name:<10}{ratio:>11.2f}x baseline  {status}')
+            if status != 'ok':
+                ret = 1
+    return ret
+
+if __name__ == '__main__':
+    sys.exit( main() )
@@ -1,6 +1,36 @@
-from .utils import *
-from .log   import *
-from .block import *
-from .state import *
-from .illiterally import *
-from .cli import *
\ No newline at end of file
+import importlib
+
+# Submodules are imported on first use so commands that don't build
+# anything never pay for importing jinja2, emoji or slugify.
+_exports = {
+    'utils':       ['root_dir', 'data_file', 'read_file'],
+    'log':         ['DEBUG', 'INFO', 'WARNING', 'ERROR', 'Log', 'Indent'],
+    'delimiters':  ['DELIMITER_ALIASES'],
+    'block':       ['Block', 'BlockReader', 'LinkTable'],
+    'cache':       ['IndexCache', 'FragmentCache', 'IncludeCache'],
+    'deps':        ['OutputDependencies', 'DependencyGraph'],
+    'index':       ['BlockIndex'],
+    'discover':    ['discover_sources'],
+    'stats':       ['Stats'],
+    'state':       ['State'],
+    'illiterally': ['illiterally', 'build', 'build_index', 'parse_and_activate', 'watch_and_build'],
+    'server':      ['BuildServer', 'BuildRequestHandler', 'serve', 'client'],
+    'cli':         ['illiterally_cli', 'illiterally_index', 'illiterally_serve', 'illiterally_client', 'illiterally_demo', 'illiterally_dogfood'],
+}
+_modules = { name: module for module,names in _exports.items() for name in names }
+
+__all__ = list( _modules )
+
+# the illiterally() function shadows its submodule, bind it up front so a
+# later import of the submodule can't replace it (this import is cheap)
+from .illiterally import illiterally
+
+def __getattr__( name: str ):
+    if name not in _modules:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr( importlib.import_module( '.' + _modules[name], __name__ ), name )
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted( set( globals() ) | set( __all__ ) )
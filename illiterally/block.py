@@ -1,39 +1,132 @@
 from typing import *
-import dataclasses
+import array
+import io
 import os
+import sys
 
-import emoji
-import slugify
+from .delimiters import emojize, demojize
 
 
 # 🚀 Block Definition
-@dataclasses.dataclass
 class Block:
-    name:      str
-    filename:  str
-    line:      int 
-    text:      str = ''
-    slug:      str = ''
-    slug_base: str = ''
-    parent:    str = ''
-    nested:    list[str] = dataclasses.field(default_factory=list)
-    path:      list[str] = dataclasses.field(default_factory=list)
-    left:      str = None
-    right:     str = None
-    #rendered:      str = None
-    rendered_into: str = None
+    # large indexes hold hundreds of thousands of blocks, so blocks are
+    # slotted and store their hierarchy as indices into a family list shared
+    # by a top-level block and its nested blocks. parent, path and nested
+    # are derived from it on access.
+    __slots__ = ('name','filename','line','slug','slug_base','left','right','rendered_into','spans','buffer','family','index','parent_index','children','links')
+
+    def __init__( self, name: str, filename: str, line: int, slug: str='', slug_base: str='', left: str=None, right: str=None, rendered_into: str=None, spans: Iterable[int]=(), buffer: list[str]=None, family: list['Block']=None, index: int=0, parent_index: int=-1, children: Iterable[int]=None, links: 'LinkTable'=None ):
+        self.name          = name
+        self.filename      = sys.intern( filename )
+        self.line          = line
+        self.slug          = slug
+        self.slug_base     = slug_base
+        self.left          = left
+        self.right         = right
+        self.rendered_into = rendered_into
+        # text is stored as flattened [start,end) line spans into a buffer
+        # shared with the rest of the family, only joined when a template
+        # asks for it
+        self.spans         = array.array( 'I', spans )
+        self.buffer        = buffer
+        self.family        = family
+        self.index         = index
+        self.parent_index  = parent_index
+        self.children      = array.array( 'I', children ) if children else None
+        # relative links are looked up in a table shared by every block
+        # once rendering starts
+        self.links         = links
+
+    @property
+    def text( self ):
+        if self.buffer is None:
+            return ''
+        spans = self.spans
+        return ''.join( self.buffer[i] for s in range(0,len(spans),2) for i in range(spans[s],spans[s+1]) )
+
+    @property
+    def parent_block( self ) -> Optional['Block']:
+        return self.family[self.parent_index] if self.parent_index >= 0 else None
+
+    @property
+    def parent( self ) -> str:
+        return self.family[self.parent_index].slug if self.parent_index >= 0 else ''
+
+    @property
+    def path( self ) -> list[str]:
+        path = []
+        blk = self
+        while blk is not None:
+            path.append( blk.slug )
+            blk = blk.parent_block
+        return path[::-1]
+
+    @property
+    def nested( self ) -> list[str]:
+        return [ self.family[i].slug for i in self.children ] if self.children else []
+
+    def add_child( self, child: 'Block' ):
+        if self.children is None:
+            self.children = array.array( 'I' )
+        self.children.append( child.index )
 
     @property
     def is_rendered( self ):
         return self.rendered_into is not None
 
     def source_path( self, targ: str ):
+        if self.links is not None:
+            return self.links.relpath( self.filename, targ )
         return os.path.relpath( self.filename, os.path.dirname(targ) )
 
     def ref(self, targ: str ):
         if self.rendered_into == targ:
             return ''
-        return os.path.relpath( self.rendered_into, os.path.dirname(targ) ) if self.rendered_into else 'INVALID'
+        if not self.rendered_into:
+            return 'INVALID'
+        if self.links is not None:
+            return self.links.relpath( self.rendered_into, targ )
+        return os.path.relpath( self.rendered_into, os.path.dirname(targ) )
+
+    def fields( self ):
+        return dict( name=self.name, filename=self.filename, line=self.line, slug=self.slug, slug_base=self.slug_base, parent=self.parent, nested=self.nested, path=self.path, left=self.left, right=self.right, rendered_into=self.rendered_into, spans=list(self.spans) )
+
+    def __eq__( self, other ):
+        if not isinstance( other, Block ):
+            return NotImplemented
+        return self.fields() == other.fields() and self.text == other.text
+
+    __hash__ = None
+
+    def __repr__( self ):
+        return 'Block(' + ', '.join( f'{k}={v!r}' for k,v in self.fields().items() ) + ')'
+
+    def __getstate__( self ):
+        return { k: getattr(self,k) for k in self.__slots__ }
+
+    def __setstate__( self, state ):
+        for k,v in state.items():
+            setattr( self, k, v )
+        self.filename = sys.intern( self.filename )
+# 🚗
+
+# 🚀 Link Table
+class LinkTable:
+    # relative links from the directory of an output file to other outputs
+    # and to source files, keyed by (output dir, target path). Links are
+    # computed the first time a template asks for them and shared by every
+    # output in the same directory, so templates never recompute a path
+    __slots__ = ('links',)
+
+    def __init__( self ):
+        self.links = {}
+
+    def relpath( self, path: str, targ: str ) -> str:
+        key = (os.path.dirname(targ),path)
+        link = self.links.get( key )
+        if link is None:
+            link = self.links[key] = os.path.relpath( path, key[0] )
+        return link
 # 🚗
 
 # 🚀 Block Reader
@@ -41,23 +134,58 @@ class BlockReader:
 
     # 🚀 Entry point for parsing
     @staticmethod
-    def index_blocks( filename: str, *args, duplicates: Set[str]=None, left: str=None, right:str=None, **kwargs ):
+    def index_blocks( filename: str, *args, duplicates: Set[str]=None, left: str=None, right:str=None, text: str=None, **kwargs ):
+        # the file is read once and shared by detection and parsing
+        if text is None:
+            with open( filename ) as f:
+                text = f.read()
+
         if left is None or right is None:
-            left,right = BlockReader.detect_left_right( filename )
+            # auto-detected delimiters are emoji, pure ascii files have none
+            if text.isascii():
+                return None
+            left,right = BlockReader.detect_left_right( filename, text )
             if None in [left,right]:
                 return None
+        elif text.isascii() and demojize(left) not in text:
+            return {}
 
-        dummy = Block('dummy','invalid',-1)
-        reader = BlockReader( filename, *args, duplicates=duplicates, left=left, right=right, **kwargs )
-        reader.read_block( dummy )
-        return reader.blocks
+        reader = BlockReader( filename, *args, duplicates=duplicates, left=left, right=right, text=text, **kwargs )
+        return { blk.slug: blk for blk in reader.iter_blocks() }
+    # 🚗
+
+    # 🚀 Slug de-duplication
+    @staticmethod
+    def dedup_slug( filename: str, slug: str ):
+        import slugify
+        return slugify.slugify( os.path.basename(filename) + '-' + slug )
+
+    @staticmethod
+    def rename_blocks( blocks: Dict[str,Block], duplicates: Set[str] ):
+        # every member of a family is renamed, including blocks whose slug
+        # repeats within the file and was overwritten in the index
+        families = { id(blk.family): blk.family for blk in blocks.values() }
+        renamed = [ member for family in families.values() for member in family if member.slug_base in duplicates ]
+        if not renamed:
+            return blocks
+        # parents, paths and nested lists refer to blocks rather than
+        # slugs, so renaming a block is seen by its whole family
+        for blk in renamed:
+            blk.slug = BlockReader.dedup_slug( blk.filename, blk.slug_base )
+        return { blk.slug: blk for blk in blocks.values() }
     # 🚗
 
     # 🚀 Delimiter auto-detection
     @staticmethod
-    def detect_left_right( filename: str ):
+    def detect_left_right( filename: str, text: str=None ):
+        if text is None:
+            with open( filename ) as f:
+                text = f.read()
+        import emoji
         left, right = None, None
-        for line in open(filename).readlines():
+        for line in io.StringIO( text ):
+            if line.isascii():
+                continue
             emojis = emoji.distinct_emoji_list(line)
             if len(emojis) > 0:
                 assert( len(emojis) == 1 )
@@ -70,71 +198,105 @@ class BlockReader:
     # 🚗
 
     # 🚀 Parser state
-    def __init__( self, filename, duplicates: Set[str]=None, left: str='🔥', right: str='🧯', suppress: bool=False ):
+    def __init__( self, filename, duplicates: Set[str]=None, left: str='🔥', right: str='🧯', suppress: bool=False, text: str=None ):
         self.duplicates = duplicates or set()
-        self.left_emo  = emoji.emojize(left)
-        self.left_str  = emoji.demojize(left)
-        self.right_emo = emoji.emojize(right)
-        self.right_str = emoji.demojize(right)
+        self.left_emo  = emojize(left)
+        self.left_str  = demojize(left)
+        self.right_emo = emojize(right)
+        self.right_str = demojize(right)
         self.suppress  = suppress
-        self.filename = filename
-        self.file = open(filename)
+        self.filename = sys.intern( filename )
+        # without text the file is streamed a line at a time
+        self.file = open( filename ) if text is None else io.StringIO( text )
         self.line_number = 0
-        self.blocks = {}
+        self.root = Block('dummy','invalid',-1)
 
     def readline( self ):
         line = self.file.readline()
         self.line_number += 1
         return line
+
+    def append_text( self, block: Block, text: str ):
+        # text outside of any block is discarded rather than buffered
+        if block is self.root:
+            return
+        end = len(block.buffer)
+        block.buffer.append( text )
+        if block.spans and block.spans[-1] == end:
+            block.spans[-1] = end+1
+        else:
+            block.spans.extend( (end,end+1) )
     # 🚗
 
     # 🚀 Bracket Detection
     def is_left( self, line: str ) -> str:
-        toks = emoji.demojize(line).split(self.left)
+        toks = demojize(line).split(self.left_str)
         return toks[1].strip() if len(toks) == 2 else None
     
     def is_right( self, line: str ) -> str:
-        toks = emoji.demojize(line).split(self.right)
+        toks = demojize(line).split(self.right_str)
         return toks[1].strip() if len(toks) == 2 else None
     # 🚗
 
     # 🚀 Block parsing
-    def read_block( self, block: Block ):
-        block.line = self.line_number
-        while True:
-            orig_line = self.readline()
-            line = emoji.demojize( orig_line )
-            if line == '':
-                break
-            elif self.left_str in line:
-                name = line.split(self.left_str)[1].strip()
-                slug = slugify.slugify(name)
-                slug_base = slug
-                if slug in self.duplicates:
-                    slug = slugify.slugify( os.path.basename(self.filename) + '-' + slug )
-                newblock = Block(
-                    filename  = self.filename,
-                    name      = name,
-                    line      = self.line_number,
-                    slug      = slug,
-                    slug_base = slug_base,
-                    parent    = block.slug,
-                    path      = block.path + [slug],
-                    left      = self.left_emo if not self.suppress else '',
-                    right     = self.right_emo if not self.suppress else ''
-                )
-                self.read_block( newblock )
-                self.blocks[newblock.slug] = newblock
-                block.nested.append( newblock.slug )
-
-                if self.suppress:                      
-                    out = line.rstrip().replace(self.left_str,'') + os.linesep
+    def iter_blocks( self ) -> Iterator[Block]:
+        '''Yields blocks as their closing delimiter is read, so nested blocks come before their parents'''
+        import slugify
+        stack = [self.root]
+        try:
+            while True:
+                block = stack[-1]
+                orig_line = self.readline()
+                line = demojize( orig_line )
+                if line == '':
+                    break
+                elif self.left_str in line:
+                    name = line.split(self.left_str)[1].strip()
+                    slug = slugify.slugify(name)
+                    slug_base = slug
+                    if slug in self.duplicates:
+                        slug = BlockReader.dedup_slug( self.filename, slug )
+                    # each top-level block starts a new family and text
+                    # buffer which are released along with it
+                    family = [] if block is self.root else block.family
+                    newblock = Block(
+                        filename     = self.filename,
+                        name         = name,
+                        line         = self.line_number,
+                        slug         = slug,
+                        slug_base    = slug_base,
+                        left         = self.left_emo if not self.suppress else '',
+                        right        = self.right_emo if not self.suppress else '',
+                        buffer       = [] if block is self.root else block.buffer,
+                        family       = family,
+                        index        = len(family),
+                        parent_index = -1 if block is self.root else block.index
+                    )
+                    family.append( newblock )
+                    if self.suppress:                      
+                        out = line.rstrip().replace(self.left_str,'') + os.linesep
+                    else:
+                        out = orig_line.rstrip() + ' ' + self.right_emo + os.linesep
+                    self.append_text( block, out )
+                    stack.append( newblock )
+                elif self.right_str in line:
+                    if block is self.root:
+                        # unmatched closing delimiter, stop parsing
+                        break
+                    yield self.close_block( stack )
                 else:
-                    out = orig_line.rstrip() + ' ' + self.right_emo + os.linesep
-                block.text += out
-            elif self.right_str in line:
-                return
-            else:
-                block.text += line
+                    self.append_text( block, line )
+
+            # blocks still open at the end of the file are closed innermost first
+            while len(stack) > 1:
+                yield self.close_block( stack )
+        finally:
+            self.file.close()
+
+    def close_block( self, stack: list[Block] ) -> Block:
+        block = stack.pop()
+        if stack[-1] is not self.root:
+            stack[-1].add_child( block )
+        return block
     # 🚗
 # 🚗
\ No newline at end of file
@@ -0,0 +1,232 @@
+from typing import *
+import collections
+import hashlib
+import json
+import os
+
+from .block import Block
+
+# On-disk cache of per-file block indexes. Entries are keyed by the
+# absolute source path and validated against the file size, mtime and
+# content hash as well as the parser settings that produced them.
+class IndexCache:
+    version = 5
+
+    def __init__( self, cache_file: str ):
+        self.cache_file = cache_file
+        self.entries = {}
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+        try:
+            with open( cache_file ) as f:
+                data = json.load( f )
+            if data.get('version') == self.version:
+                self.entries = data['files']
+        except (OSError, ValueError, KeyError, AttributeError):
+            self.entries = {}
+
+    # the hash is taken over the decoded text the parser saw, so stored
+    # hashes never describe a different read of the file than the blocks
+    @staticmethod
+    def text_hash( text: str ):
+        return hashlib.sha1( text.encode() ).hexdigest()
+
+    @staticmethod
+    def file_hash( filename: str ):
+        with open( filename ) as f:
+            return IndexCache.text_hash( f.read() )
+
+    def lookup( self, filename: str, left: str, right: str, suppress: bool ) -> Tuple[bool,Optional[Dict[str,Block]]]:
+        '''Returns (hit,blocks) where blocks may be None for cached files without blocks'''
+        entry = self.entries.get( filename )
+        try:
+            st = os.stat( filename )
+        except OSError:
+            entry = None
+        if entry is None or entry['settings'] != [left,right,suppress] or entry['size'] != st.st_size:
+            self.misses += 1
+            return False, None
+        if entry['mtime'] != st.st_mtime_ns:
+            # touched but possibly unchanged, fall back to the content hash
+            try:
+                changed = entry['hash'] != self.file_hash( filename )
+            except (OSError, UnicodeDecodeError):
+                changed = True
+            if changed:
+                self.misses += 1
+                return False, None
+            entry['mtime'] = st.st_mtime_ns
+            self.dirty = True
+        self.hits += 1
+        if entry['blocks'] is None:
+            return True, None
+        return True, self.unpack_blocks( entry['families'], entry['blocks'], filename )
+
+    # blocks are stored per family (a top-level block and its nested blocks)
+    # along with the family's text buffer, the index itself is a list of
+    # [family,index] pairs in the original order
+    @staticmethod
+    def block_record( block: Block ):
+        return dict( name=block.name, line=block.line, slug=block.slug, slug_base=block.slug_base, left=block.left, right=block.right, spans=list(block.spans), parent_index=block.parent_index, children=list(block.children or []) )
+
+    @staticmethod
+    def pack_blocks( blocks: Dict[str,Block], record: Callable[[Block],dict]=None ):
+        record = record or IndexCache.block_record
+        families = {}
+        for blk in blocks.values():
+            families.setdefault( id(blk.family), blk )
+        position = { key: i for i,key in enumerate(families) }
+        packed = [ dict( filename=blk.filename, buffer=blk.buffer, blocks=[ record(member) for member in blk.family ] ) for blk in families.values() ]
+        return packed, [ [position[id(blk.family)],blk.index] for blk in blocks.values() ]
+
+    @staticmethod
+    def unpack_blocks( families: list[dict], order: list[list[int]], filename: str=None ) -> Dict[str,Block]:
+        unpacked = []
+        for family in families:
+            members = []
+            for index,record in enumerate( family['blocks'] ):
+                members.append( Block( filename=family.get('filename',filename), buffer=family['buffer'], family=members, index=index, **record ) )
+            unpacked.append( members )
+        return { unpacked[f][i].slug: unpacked[f][i] for f,i in order }
+
+    def store( self, filename: str, left: str, right: str, suppress: bool, blocks: Optional[Dict[str,Block]], signature: Tuple[int,int,str] ):
+        '''Stores the blocks parsed from filename, signature is the (size,mtime,hash) of the text they were parsed from'''
+        size,mtime,hash = signature
+        families,order = self.pack_blocks( blocks or {} )
+        for family in families:
+            # implied by the entry
+            del family['filename']
+        self.entries[filename] = dict(
+            size     = size,
+            mtime    = mtime,
+            hash     = hash,
+            settings = [left,right,suppress],
+            families = families,
+            blocks   = None if blocks is None else order
+        )
+        self.dirty = True
+
+    def save( self ):
+        if not self.dirty:
+            return
+        # drop entries for source files that no longer exist
+        self.entries = { f: e for f,e in self.entries.items() if os.path.exists(f) }
+        os.makedirs( os.path.dirname(self.cache_file), exist_ok=True )
+        tmp_file = self.cache_file + '.tmp'
+        with open( tmp_file, 'w' ) as f:
+            json.dump( dict( version=self.version, files=self.entries ), f )
+        os.replace( tmp_file, self.cache_file )
+        self.dirty = False
+
+# Cache of rendered block fragments, held in a size-bounded LRU in memory
+# and optionally persisted to disk. Entries record the fingerprints of the
+# blocks looked up while rendering so callers can validate them on a hit.
+class FragmentCache:
+    version = 1
+
+    def __init__( self, cache_dir: str=None, max_memory: int=64*2**20, max_disk: int=256*2**20 ):
+        self.cache_dir = cache_dir
+        self.max_memory = max_memory
+        self.max_disk = max_disk
+        self.memory = collections.OrderedDict()
+        self.memory_size = 0
+        self.written = False
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key( *args ):
+        return hashlib.sha1( repr( (FragmentCache.version,*args) ).encode() ).hexdigest()
+
+    def fragment_file( self, key: str ):
+        return os.path.join( self.cache_dir, key[:2], key + '.json' )
+
+    def get( self, key: str ) -> Optional[dict]:
+        entry = self.memory.get( key )
+        if entry is not None:
+            self.memory.move_to_end( key )
+            return entry
+        if self.cache_dir is not None:
+            try:
+                with open( self.fragment_file(key) ) as f:
+                    entry = json.load( f )
+                os.utime( self.fragment_file(key) )
+            except (OSError, ValueError):
+                return None
+            self.remember( key, entry )
+        return entry
+
+    def put( self, key: str, entry: dict ):
+        self.remember( key, entry )
+        if self.cache_dir is not None:
+            fragment_file = self.fragment_file( key )
+            os.makedirs( os.path.dirname(fragment_file), exist_ok=True )
+            with open( fragment_file + '.tmp', 'w' ) as f:
+                json.dump( entry, f )
+            os.replace( fragment_file + '.tmp', fragment_file )
+            self.written = True
+
+    def remember( self, key: str, entry: dict ):
+        if key in self.memory:
+            self.memory_size -= len( self.memory.pop(key)['text'] )
+        self.memory[key] = entry
+        self.memory_size += len( entry['text'] )
+        while self.memory_size > self.max_memory and len(self.memory) > 1:
+            _,evicted = self.memory.popitem( last=False )
+            self.memory_size -= len( evicted['text'] )
+
+    def save( self ):
+        # evict least recently used fragments from disk
+        if self.cache_dir is None or not self.written:
+            return
+        fragments = []
+        for d in os.scandir( self.cache_dir ):
+            if not d.is_dir():
+                continue
+            for e in os.scandir( d.path ):
+                st = e.stat()
+                fragments.append( (st.st_mtime_ns,st.st_size,e.path) )
+        total = sum( size for _,size,_ in fragments )
+        for _,size,path in sorted( fragments ):
+            if total <= self.max_disk:
+                break
+            os.remove( path )
+            total -= size
+        self.written = False
+
+# In-memory cache of files included by templates, shared by every output
+# rendered by a State (and every build of a build server). Entries are
+# keyed by the resolved path and validated against the file's mtime and
+# size, least recently used files are evicted beyond max_memory characters.
+class IncludeCache:
+    def __init__( self, max_memory: int=64*2**20 ):
+        self.max_memory = max_memory
+        self.memory = collections.OrderedDict()
+        self.memory_size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def read( self, filename: str ) -> str:
+        path = os.path.realpath( filename )
+        st = os.stat( path )
+        stamp = (st.st_mtime_ns, st.st_size)
+        entry = self.memory.get( path )
+        if entry is not None and entry[0] == stamp:
+            self.memory.move_to_end( path )
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        with open( path ) as f:
+            text = f.read()
+        self.remember( path, (stamp,text) )
+        return text
+
+    def remember( self, path: str, entry: tuple ):
+        if path in self.memory:
+            self.memory_size -= len( self.memory.pop(path)[1] )
+        self.memory[path] = entry
+        self.memory_size += len( entry[1] )
+        while self.memory_size > self.max_memory and len(self.memory) > 1:
+            _,evicted = self.memory.popitem( last=False )
+            self.memory_size -= len( evicted[1] )
@@ -1,15 +1,14 @@
 import os
 import sys
-import glob
 import shutil
 import argparse
 
 from .utils import data_file, root_dir
+from .log import DEBUG, INFO, WARNING
 from .illiterally import illiterally
 
-def illiterally_cli( argv=sys.argv ):
-    parser = argparse.ArgumentParser('illiterally')
-    parser.add_argument('-s',           '--source', type=str, nargs='+', required=True,      help='Source file')
+def add_build_arguments( parser: argparse.ArgumentParser, sources_required: bool=True ):
+    parser.add_argument('-s',           '--source', type=str, nargs='+', required=sources_required, help='Source files, directories (scanned recursively) or glob patterns')
     parser.add_argument('-b',            '--block', type=str,            required=True,      help='Block template')
     parser.add_argument('-o',         '--template', type=str, nargs='+', required=True,      help='Output template')
     parser.add_argument('-sp',   '--source-prefix', type=str,            default='.',        help='Prefix removed from source filenames in output')
@@ -18,27 +17,123 @@ def illiterally_cli( argv=sys.argv ):
     parser.add_argument( '-x',        '--suppress', action='store_true',                     help='Provide empty strings to templates as delimiters')
     parser.add_argument('-l',             '--left', type=str,            default=None,       help='Optional: Left bracket string')
     parser.add_argument('-r',            '--right', type=str,            default=None,       help='Optional: Right bracket string')
-    
-    try:
-        args = parser.parse_args( argv[1:] )   
-        assert (args.left and args.right) or (not args.left and not args.right) 
-    except:
-        sys.exit(1)
+    parser.add_argument('-c',            '--cache', action='store_true',                     help='Reuse block indexes and compiled templates between runs and only re-render outputs whose inputs changed')
+    parser.add_argument('-j',             '--jobs', type=int,            default=1,          help='Number of worker processes, 0 uses all cores')
+    parser.add_argument('-q',            '--quiet', action='store_true',                     help='Only log warnings and errors')
+    parser.add_argument('-v',          '--verbose', action='store_true',                     help='Log every block as it is indexed, activated and rendered')
+    parser.add_argument(             '--cache-dir', type=str,            default=None,       help='Optional: Cache directory, defaults to OUTPUT_DIR/.illiterally')
+    parser.add_argument(               '--include', type=str, nargs='+', default=None,       help='Optional: Only use scanned files matching these .gitignore-style patterns')
+    parser.add_argument(               '--exclude', type=str, nargs='+', default=None,       help='Optional: Skip scanned files and directories matching these .gitignore-style patterns')
+    parser.add_argument(             '--extension', type=str, nargs='+', default=None,       help='Optional: Only use scanned files with these extensions, e.g. .py .cpp')
+    parser.add_argument(              '--max-size', type=int,            default=None,       help='Optional: Skip scanned files larger than this many bytes')
+    parser.add_argument(           '--ignore-file', type=str, nargs='*', default=None,       help='Optional: Names of ignore files honoured while scanning, defaults to .gitignore .illiterallyignore')
 
+def build_kwargs( args: argparse.Namespace ):
     kwargs = dict(
-        source_files     = args.source,
+        source_files     = args.source or [],
         template_files   = args.template,
         block_template   = args.block,
         suppress         = args.suppress,
         source_prefix    = args.source_prefix,
         template_prefix  = args.template_prefix,
         output_dir       = args.output_dir,
+        cache            = args.cache,
+        cache_dir        = args.cache_dir,
+        jobs             = args.jobs,
+        log_level        = WARNING if args.quiet else DEBUG if args.verbose else INFO,
+        include          = args.include,
+        exclude          = args.exclude,
+        extensions       = args.extension,
+        max_size         = args.max_size,
+        ignore_files     = args.ignore_file,
     )
     if args.left and args.right:
         kwargs['left']  = args.left
         kwargs['right'] = args.right
+    return kwargs
+
+def parse_arguments( parser: argparse.ArgumentParser, argv: list[str] ):
+    try:
+        args = parser.parse_args( argv )
+        assert 'left' not in args or (args.left and args.right) or (not args.left and not args.right)
+    except:
+        sys.exit(1)
+    return args
+
+def illiterally_cli( argv=sys.argv ):
+    # 'serve' and 'client' run a build server and talk to it, 'index'
+    # writes a block index, anything else is a regular one-shot build
+    if len(argv) > 1 and argv[1] == 'index':
+        return illiterally_index( argv[1:] )
+    if len(argv) > 1 and argv[1] == 'serve':
+        return illiterally_serve( argv[1:] )
+    if len(argv) > 1 and argv[1] == 'client':
+        return illiterally_client( argv[1:] )
+
+    parser = argparse.ArgumentParser('illiterally')
+    add_build_arguments( parser, sources_required=False )
+    parser.add_argument('-w',            '--watch', action='store_true',                     help='Keep rebuilding outputs as their inputs change, implies --cache')
+    parser.add_argument('-i',            '--index', type=str,            default=None,       help="Optional: Render from a block index written by 'illiterally index' instead of parsing sources")
+    parser.add_argument(                 '--stats', type=str,            default=None,       help='Optional: Write per-phase timings and counters to this JSON file')
+    parser.add_argument(               '--profile', type=str,            default=None,       help='Optional: Write a cProfile dump of the run to this file')
+    args = parse_arguments( parser, argv[1:] )
+    if (args.source is None) == (args.index is None) or (args.index and args.watch):
+        parser.print_usage()
+        sys.exit(1)
+
+    return illiterally(
+        **build_kwargs( args ),
+        watch        = args.watch,
+        stats_file   = args.stats,
+        profile_file = args.profile,
+        index_file   = args.index,
+    )
+
+def illiterally_index( argv=sys.argv ):
+    parser = argparse.ArgumentParser('illiterally index')
+    add_build_arguments( parser )
+    parser.add_argument('-i',            '--index', type=str,            required=True,      help='Block index file to write')
+    args = parse_arguments( parser, argv[1:] )
+
+    from .state import State
+    from .illiterally import build_index
+    S = State( **build_kwargs( args ) )
+    try:
+        return build_index( S, args.index )
+    finally:
+        S.log.close()
+
+def illiterally_serve( argv=sys.argv ):
+    parser = argparse.ArgumentParser('illiterally serve')
+    add_build_arguments( parser )
+    parser.add_argument(                '--socket', type=str,            default='.illiterally.sock', help='Unix socket to listen on')
+    args = parse_arguments( parser, argv[1:] )
+
+    from .state import State
+    from .server import serve
+    kwargs = build_kwargs( args )
+    kwargs['cache'] = True
+    return serve( State( **kwargs ), args.socket )
 
-    return illiterally( **kwargs )
+def illiterally_client( argv=sys.argv ):
+    parser = argparse.ArgumentParser('illiterally client')
+    parser.add_argument('command', choices=['build','render','shutdown'],                    help='Request to send to the build server')
+    parser.add_argument('template', type=str, nargs='?',                default=None,        help='Output template to render, for the render command')
+    parser.add_argument(                '--socket', type=str,            default='.illiterally.sock', help='Unix socket of the build server')
+    args = parse_arguments( parser, argv[1:] )
+    if args.command == 'render' and args.template is None:
+        parser.print_usage()
+        sys.exit(1)
+
+    # the client only needs the socket, not the build machinery. Templates
+    # are resolved here since the server may run in another directory
+    from .server import client
+    kwargs = dict( template=os.path.abspath(args.template) ) if args.command == 'render' else {}
+    try:
+        return client( args.socket, args.command, **kwargs )
+    except OSError as e:
+        print(f'[ERROR]: Could not reach build server on {args.socket}: {e}')
+        return 1
 
 def illiterally_demo():
     shutil.copyfile( data_file('examples/docs/example.cpp'), './example.cpp' )
@@ -59,7 +154,8 @@ def illiterally_dogfood():
     )
 
     illiterally(
-        source_files=sorted(glob.glob(os.path.join(root_dir(),'*.py'))),
+        source_files=[root_dir()],
+        extensions=['.py'],
         block_template='block.md',
         template_files=[ data_file('examples/README.md'), data_file('examples/docs/implementation.md') ],
         template_prefix=data_file('examples'),
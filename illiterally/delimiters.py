@@ -0,0 +1,37 @@
+from typing import *
+
+# Names of commonly used delimiter emoji, matching emoji.demojize. Looking
+# delimiters up here avoids importing the emoji package (and its database)
+# just to normalize them, anything else falls back to the emoji package.
+DELIMITER_ALIASES = {
+    '\U0001F525': ':fire:',
+    '\U0001F9EF': ':fire_extinguisher:',
+    '\U0001FAF8': ':rightwards_pushing_hand:',
+    '\U0001FAF7': ':leftwards_pushing_hand:',
+    '\U0001F680': ':rocket:',
+    '\U0001F697': ':automobile:',
+    '\U0001F449': ':backhand_index_pointing_right:',
+    '\U0001F448': ':backhand_index_pointing_left:',
+    '\U0001F4CC': ':pushpin:',
+    '\U0001F3C1': ':chequered_flag:',
+    '\U0001F7E2': ':green_circle:',
+    '\U0001F534': ':red_circle:',
+}
+DELIMITER_EMOJI = { alias: emo for emo,alias in DELIMITER_ALIASES.items() }
+
+def emojize( text: str ) -> str:
+    if text in DELIMITER_EMOJI:
+        return DELIMITER_EMOJI[text]
+    if text in DELIMITER_ALIASES or text.count(':') < 2:
+        # nothing that could be a :name: alias
+        return text
+    import emoji
+    return emoji.emojize( text )
+
+def demojize( text: str ) -> str:
+    if text.isascii():
+        return text
+    if text in DELIMITER_ALIASES:
+        return DELIMITER_ALIASES[text]
+    import emoji
+    return emoji.demojize( text )
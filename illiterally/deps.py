@@ -0,0 +1,85 @@
+from typing import *
+import dataclasses
+import hashlib
+import json
+import os
+
+from .block import Block
+
+# Inputs touched while rendering a single output file
+@dataclasses.dataclass
+class OutputDependencies:
+    files: Set[str] = dataclasses.field(default_factory=set)
+    slugs: Set[str] = dataclasses.field(default_factory=set)
+
+# Persistent record of what each output file was rendered from. An output
+# only needs to be re-rendered when one of its template, include or block
+# template files changed, when a different block template is used, or when
+# any block it looked up changed (including where that block was rendered
+# into, since links depend on it).
+class DependencyGraph:
+    version = 2
+
+    def __init__( self, deps_file: str ):
+        self.deps_file = deps_file
+        self.outputs = {}
+        self.dirty = False
+        try:
+            with open( deps_file ) as f:
+                data = json.load( f )
+            if data.get('version') == self.version:
+                self.outputs = data['outputs']
+        except (OSError, ValueError, KeyError, AttributeError):
+            self.outputs = {}
+
+    @staticmethod
+    def file_fingerprint( filename: str ):
+        try:
+            st = os.stat( filename )
+        except OSError:
+            return None
+        return [st.st_size, st.st_mtime_ns]
+
+    @staticmethod
+    def block_fingerprint( block: Optional[Block] ):
+        if block is None:
+            return None
+        h = hashlib.sha1()
+        for value in (block.name, block.filename, block.line, block.slug, block.parent, block.nested, block.path, block.left, block.right, block.rendered_into, block.text):
+            h.update( repr(value).encode() )
+            h.update( b'\0' )
+        return h.hexdigest()
+
+    def is_up_to_date( self, output_file: str, fingerprint: Callable[[str],Optional[str]], suppress: bool, block_template: str ):
+        record = self.outputs.get( output_file )
+        if record is None or record['suppress'] != suppress or record['block_template'] != block_template or not os.path.exists( output_file ):
+            return False
+        for filename,recorded in record['files'].items():
+            if self.file_fingerprint( filename ) != recorded:
+                return False
+        for slug,recorded in record['blocks'].items():
+            if fingerprint( slug ) != recorded:
+                return False
+        return True
+
+    def record( self, output_file: str, deps: OutputDependencies, fingerprint: Callable[[str],Optional[str]], suppress: bool, block_template: str ):
+        self.outputs[output_file] = dict(
+            suppress       = suppress,
+            block_template = block_template,
+            files          = { f: self.file_fingerprint(f) for f in sorted(deps.files) },
+            blocks         = { s: fingerprint(s) for s in sorted(deps.slugs) }
+        )
+        self.dirty = True
+
+    def files( self ):
+        return sorted( set( f for record in self.outputs.values() for f in record['files'] ) )
+
+    def save( self ):
+        if not self.dirty:
+            return
+        os.makedirs( os.path.dirname(self.deps_file), exist_ok=True )
+        tmp_file = self.deps_file + '.tmp'
+        with open( tmp_file, 'w' ) as f:
+            json.dump( dict( version=self.version, outputs=self.outputs ), f )
+        os.replace( tmp_file, self.deps_file )
+        self.dirty = False
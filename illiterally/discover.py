@@ -0,0 +1,220 @@
+from typing import *
+import concurrent.futures
+import glob
+import os
+import queue
+import re
+
+# Source discovery for directory and glob sources. Directories are walked
+# with os.scandir across a thread pool, each directory is a separate task
+# so deep or wide trees are listed concurrently. Files are prefiltered on
+# extension, ignore rules, include patterns and size (in that order, from
+# cheapest to most expensive) before they ever reach the parser.
+
+# ignore files read from every scanned directory
+IGNORE_FILES = ['.gitignore', '.illiterallyignore']
+
+# version control directories are never scanned
+SKIP_DIRS = set(['.git', '.hg', '.svn'])
+
+def translate_pattern( pattern: str ) -> str:
+    '''Converts a .gitignore-style glob into a regular expression matched against "/" separated relative paths'''
+    out = []
+    i,n = 0,len(pattern)
+    while i < n:
+        if pattern.startswith('**/', i):
+            out.append('(?:.*/)?')
+            i += 3
+        elif pattern.startswith('/**', i) and i+3 == n:
+            out.append('(?:/.*)?')
+            i += 3
+        elif pattern.startswith('**', i):
+            out.append('.*')
+            i += 2
+        elif pattern[i] == '*':
+            out.append('[^/]*')
+            i += 1
+        elif pattern[i] == '?':
+            out.append('[^/]')
+            i += 1
+        elif pattern[i] == '[' and pattern.find(']', i+2) > 0:
+            j = pattern.find(']', i+2)
+            body = pattern[i+1:j].replace('\\','\\\\')
+            out.append( '[' + ('^'+body[1:] if body[0] == '!' else body) + ']' )
+            i = j+1
+        else:
+            out.append( re.escape(pattern[i]) )
+            i += 1
+    return ''.join(out)
+
+class IgnoreRules:
+    '''Immutable list of .gitignore-style rules, later rules take precedence over earlier ones'''
+    __slots__ = ['rules']
+
+    def __init__( self, rules: tuple=() ):
+        self.rules = rules
+
+    @staticmethod
+    def parse( pattern: str, base: str='' ):
+        # returns (base,regex,negate,dir_only), patterns containing a '/'
+        # are anchored to base, everything else matches at any depth
+        pattern = pattern.rstrip()
+        if not pattern or pattern.startswith('#'):
+            return None
+        negate = pattern.startswith('!')
+        pattern = pattern[1:] if negate else pattern
+        dir_only = pattern.endswith('/')
+        pattern = pattern.rstrip('/')
+        if not pattern:
+            return None
+        regex = translate_pattern( pattern.lstrip('/') )
+        if '/' not in pattern:
+            regex = '(?:.*/)?' + regex
+        return (base, re.compile(regex), negate, dir_only)
+
+    def extend( self, patterns: Iterable[str], base: str='' ) -> 'IgnoreRules':
+        rules = [ rule for rule in (IgnoreRules.parse(p, base) for p in patterns) if rule is not None ]
+        return IgnoreRules( self.rules + tuple(rules) ) if rules else self
+
+    def matches( self, path: str, is_dir: bool ) -> bool:
+        for base,regex,negate,dir_only in reversed( self.rules ):
+            if dir_only and not is_dir:
+                continue
+            if base:
+                if not path.startswith( base + '/' ):
+                    continue
+                rel = path[len(base)+1:]
+            else:
+                rel = path
+            if regex.fullmatch( rel ):
+                return not negate
+        return False
+
+    def __bool__( self ):
+        return len(self.rules) > 0
+
+class SourceFilter:
+    '''Decides which files of a scanned directory tree are source files'''
+    def __init__( self, include: Optional[list[str]]=None, exclude: Optional[list[str]]=None, extensions: Optional[list[str]]=None, max_size: Optional[int]=None, ignore_files: Optional[list[str]]=None, skip: Optional[Iterable[str]]=None ):
+        self.include = IgnoreRules().extend( include or [] )
+        self.exclude = IgnoreRules().extend( exclude or [] )
+        self.extensions = set( e if e.startswith('.') else '.'+e for e in extensions ) if extensions else None
+        self.max_size = max_size
+        self.ignore_files = IGNORE_FILES if ignore_files is None else ignore_files
+        # absolute paths of files and directories that are never scanned,
+        # e.g. the build's own outputs, templates and cache
+        self.skip = set( os.path.abspath(p) for p in skip or [] )
+
+    def scan_directory( self, path: str, rel: str, rules: IgnoreRules ):
+        '''Lists one directory, returns (files,subdirectories) with subdirectories as (path,rel,rules) tasks'''
+        try:
+            with os.scandir( path ) as it:
+                entries = list( it )
+        except OSError:
+            # unreadable directories are skipped, as find/git do
+            return [],[]
+
+        names = set( entry.name for entry in entries )
+        for ignore_file in self.ignore_files:
+            if ignore_file in names:
+                try:
+                    with open( os.path.join( path, ignore_file ), encoding='utf-8', errors='replace' ) as f:
+                        rules = rules.extend( f.read().splitlines(), rel )
+                except OSError:
+                    pass
+
+        files,subdirs = [],[]
+        for entry in entries:
+            if entry.path in self.skip:
+                continue
+            entry_rel = rel + '/' + entry.name if rel else entry.name
+            try:
+                # symlinked directories are not followed to avoid cycles
+                if entry.is_dir( follow_symlinks=False ):
+                    if entry.name not in SKIP_DIRS and not rules.matches( entry_rel, True ):
+                        subdirs.append( (entry.path, entry_rel, rules) )
+                elif entry.is_file() and self.accept( entry.name, entry_rel, rules, entry.stat ):
+                    files.append( entry.path )
+            except OSError:
+                continue
+        return files,subdirs
+
+    def accept( self, name: str, rel: str, rules: IgnoreRules, stat: Callable[[],os.stat_result] ) -> bool:
+        if self.extensions is not None and os.path.splitext( name )[1] not in self.extensions:
+            return False
+        if rules.matches( rel, False ):
+            return False
+        if self.include and not self.include.matches( rel, False ):
+            return False
+        return self.max_size is None or stat().st_size <= self.max_size
+
+    def skipped( self, path: str, root: str ) -> bool:
+        '''True if path or a directory between it and root is skipped'''
+        path,root = os.path.abspath( path ),os.path.abspath( root )
+        while self.skip and path != root:
+            if path in self.skip:
+                return True
+            parent = os.path.dirname( path )
+            if parent == path:
+                break
+            path = parent
+        return False
+
+    def scan( self, root: str, workers: Optional[int]=None, directories: Optional[list[str]]=None ) -> list[str]:
+        '''Recursively lists the source files below root, sorted. Scanned directories are appended to directories if given'''
+        # entry paths are compared against skip, so they must be absolute
+        root = os.path.abspath( root )
+        files = []
+        if directories is not None:
+            directories.append( root )
+        results = queue.SimpleQueue()
+        with concurrent.futures.ThreadPoolExecutor( max_workers=workers ) as pool:
+            submit = lambda task: pool.submit( self.scan_directory, *task ).add_done_callback( results.put )
+            submit( (root, '', self.exclude) )
+            outstanding = 1
+            while outstanding > 0:
+                dir_files,subdirs = results.get().result()
+                outstanding -= 1
+                files.extend( dir_files )
+                for task in subdirs:
+                    submit( task )
+                    if directories is not None:
+                        directories.append( task[0] )
+                outstanding += len(subdirs)
+        return sorted( files )
+
+def is_glob( source: str ) -> bool:
+    return re.search( r'[*?[]', source ) is not None
+
+def discover_sources( sources: list[str], include: Optional[list[str]]=None, exclude: Optional[list[str]]=None, extensions: Optional[list[str]]=None, max_size: Optional[int]=None, ignore_files: Optional[list[str]]=None, workers: Optional[int]=None, directories: Optional[list[str]]=None, skip: Optional[Iterable[str]]=None ) -> list[str]:
+    '''Expands directory and glob sources into absolute source file paths
+
+    Files named explicitly are always kept, directories (including those
+    matched by globs) are scanned recursively and filtered. The result keeps
+    the order of the sources with duplicates removed. If directories is
+    given, every scanned directory and every directory holding a glob match
+    is appended to it, so callers can watch them for new files. Files and
+    directories in skip are left out of scans and glob matches.'''
+    source_filter = SourceFilter( include, exclude, extensions, max_size, ignore_files, skip )
+    found = []
+    for source in sources:
+        if is_glob( source ) and not os.path.exists( source ):
+            root = source
+            while is_glob( root ):
+                root = os.path.dirname( root )
+            for path in sorted( glob.glob( source, recursive=True ) ):
+                if source_filter.skipped( path, root ):
+                    continue
+                # glob matches are filtered by name, ignore files don't apply
+                name = os.path.basename( path )
+                if os.path.isdir( path ):
+                    found.extend( source_filter.scan( path, workers, directories ) )
+                elif source_filter.accept( name, name, source_filter.exclude, lambda: os.stat(path) ):
+                    found.append( path )
+                    if directories is not None:
+                        directories.append( os.path.dirname(path) )
+        elif os.path.isdir( source ):
+            found.extend( source_filter.scan( source, workers, directories ) )
+        else:
+            found.append( source )
+    return list( dict.fromkeys( os.path.abspath(f) for f in found ) )
@@ -1,46 +1,128 @@
 # 🚀 Illiterally Implementation
 from typing import *
-import dataclasses
-import slugify
-import jinja2
-import emoji
-import io
 import os
+import time
 
-from illiterally.log import Log, Indent
-from illiterally.block import Block,BlockReader
-from illiterally.state import State
+from illiterally.log import Log, Indent, INFO
+from illiterally.stats import Stats
+
+# State pulls in jinja2, it is imported when a build actually starts
+if TYPE_CHECKING:
+    from illiterally.state import State
 
 # 🚀 Entry Point
-def illiterally( source_files: list[str], template_files: list[str], block_template: str, output_dir: str='./output', source_prefix: Optional[str]=None, template_prefix: Optional[str]=None, left: str=None, right: str=None, suppress: bool=False ):
-    S = State(
-        source_files = source_files,
-        template_files = template_files,
-        block_template = block_template, 
-        output_dir = output_dir,
-        source_prefix = source_prefix,
-        template_prefix = template_prefix,
-        left = left,
-        right = right,
-        suppress = suppress
-    )
-
-    # build a list of all slugs in the source files
+def illiterally( source_files: list[str], template_files: list[str], block_template: str, output_dir: str='./output', source_prefix: Optional[str]=None, template_prefix: Optional[str]=None, left: str=None, right: str=None, suppress: bool=False, cache: bool=False, cache_dir: str=None, jobs: int=1, watch: bool=False, log_level: int=INFO, stats_file: str=None, profile_file: str=None, index_file: str=None, include: list[str]=None, exclude: list[str]=None, extensions: list[str]=None, max_size: int=None, ignore_files: list[str]=None ):
+    from illiterally.state import State
+    stats = Stats()
+    profile = None
+    if profile_file:
+        import cProfile
+        profile = cProfile.Profile()
+        profile.enable()
+    S = None
+    try:
+        with stats.phase('setup'):
+            S = State(
+                source_files = source_files,
+                template_files = template_files,
+                block_template = block_template, 
+                output_dir = output_dir,
+                source_prefix = source_prefix,
+                template_prefix = template_prefix,
+                left = left,
+                right = right,
+                suppress = suppress,
+                cache = cache or watch,
+                cache_dir = cache_dir,
+                jobs = jobs,
+                log_level = log_level,
+                stats = stats,
+                include = include,
+                exclude = exclude,
+                extensions = extensions,
+                max_size = max_size,
+                ignore_files = ignore_files
+            )
+        if watch:
+            return watch_and_build( S )
+        return build( S, index_file=index_file )
+    finally:
+        if S is not None:
+            S.log.close()
+        if profile is not None:
+            profile.disable()
+            profile.dump_stats( profile_file )
+        if stats_file:
+            stats.save( stats_file )
+
+# 🚗
+
+# 🚀 Build Pipeline
+def build( S: 'State', template_files: Optional[list[str]]=None, index_file: Optional[str]=None ):
+    if index_file is not None:
+        # blocks were parsed, de-duplicated and activated when the
+        # index was written, go straight to rendering
+        blocks = S.load_index( index_file )
+        if blocks is None:
+            return 1
+    else:
+        blocks = parse_and_activate( S )
+        if blocks is None:
+            return 1
+    S.render_blocks_from_templates( blocks, template_files )
+
+    S.log.flush()
+    return 0
+
+def build_index( S: 'State', index_file: str ):
+    blocks = parse_and_activate( S )
+    if blocks is None:
+        return 1
+    S.save_index( blocks, index_file )
+    return 0
+
+def parse_and_activate( S: 'State' ):
+    # build a list of all slugs in the source files, colliding
+    # slugs are de-duplicated in place
     blocks,duplicates = S.parse_blocks()
     if len(duplicates) > 0:
-        # duplicates found, de-duplicate
-        blocks,duplicates = S.parse_blocks(duplicates)
-        if len(duplicates) > 0:
-            # duplicates still found. What the...
-            return 1
+        # duplicates still found. What the...
+        S.log.flush()
+        return None
 
     # now go over all of the template files and activate
     # any blocks that they will render
     S.activate_blocks_from_templates( blocks )
-    S.render_blocks_from_templates( blocks )
+    return blocks
 
-    return 0
+# 🚗
 
+# 🚀 Watch Mode
+def watch_and_build( S: 'State', interval: float=0.5 ):
+    # rebuilds whenever a source, template, include or block template file
+    # changes, or files are added to or removed from a scanned source
+    # directory. Only out of date outputs are re-rendered by each build
+    from illiterally.deps import DependencyGraph
+    watched_files = lambda: set([ *S.source_files, *S.source_dirs, *S.template_files, S.block_template_file, *S.deps.files() ])
+    snapshot = lambda files: { f: DependencyGraph.file_fingerprint(f) for f in files }
+    ret = 0
+    try:
+        while True:
+            inputs = snapshot( watched_files() )
+            try:
+                ret = build( S )
+            except Exception as e:
+                # syntax errors and deleted files are normal while editing,
+                # report them and wait for the next change
+                S.log.error(f'Error: Build failed, {type(e).__name__}: {e}')
+                ret = 1
+            inputs.update( snapshot( watched_files() - inputs.keys() ) )
+            S.log.info('Watching for changes, press Ctrl-C to stop...')
+            S.log.flush()
+            while snapshot( inputs.keys() ) == inputs:
+                time.sleep( interval )
+    except KeyboardInterrupt:
+        return ret
 # 🚗
 
 # 🚗
\ No newline at end of file
@@ -0,0 +1,53 @@
+from typing import *
+import gzip
+import json
+import os
+
+from .block import Block
+from .cache import IndexCache
+
+# Portable block index written by 'illiterally index' once sources have
+# been parsed, de-duplicated and activated. Rendering can load it instead
+# of re-parsing the sources, e.g. to render subsets of the templates on
+# separate machines. Paths are stored relative to the index file so the
+# index stays valid in another checkout of the same tree.
+class BlockIndex:
+    version = 1
+
+    @staticmethod
+    def save( index_file: str, blocks: Dict[str,Block], settings: dict ):
+        base = os.path.dirname( os.path.abspath(index_file) )
+        relative = lambda path: path if path is None else os.path.relpath( path, base )
+
+        def record( block: Block ):
+            return dict( IndexCache.block_record(block), rendered_into=relative(block.rendered_into) )
+
+        families,order = IndexCache.pack_blocks( blocks, record )
+        for family in families:
+            family['filename'] = relative( family['filename'] )
+
+        if os.path.dirname( index_file ):
+            os.makedirs( os.path.dirname(index_file), exist_ok=True )
+        tmp_file = index_file + '.tmp'
+        with gzip.open( tmp_file, 'wt', encoding='utf-8' ) as f:
+            json.dump( dict( version=BlockIndex.version, settings=settings, families=families, blocks=order ), f, separators=(',',':') )
+        os.replace( tmp_file, index_file )
+
+    @staticmethod
+    def load( index_file: str ) -> Tuple[Dict[str,Block],dict]:
+        '''Returns (blocks,settings), raises ValueError for unreadable or incompatible indexes'''
+        try:
+            with gzip.open( index_file, 'rt', encoding='utf-8' ) as f:
+                data = json.load( f )
+        except (OSError, EOFError) as e:
+            raise ValueError(f'Could not read block index "{index_file}": {e}')
+        if not isinstance( data, dict ) or data.get('version') != BlockIndex.version:
+            raise ValueError(f'Block index "{index_file}" has an unsupported version.')
+
+        base = os.path.dirname( os.path.abspath(index_file) )
+        absolute = lambda path: path if path is None else os.path.normpath( os.path.join( base, path ) )
+        for family in data['families']:
+            family['filename'] = absolute( family['filename'] )
+            for record in family['blocks']:
+                record['rendered_into'] = absolute( record['rendered_into'] )
+        return IndexCache.unpack_blocks( data['families'], data['blocks'] ), data['settings']
@@ -1,30 +1,86 @@
-import io
+from typing import *
+import sys
+
+# verbosity levels, messages below the log level are dropped
+DEBUG   = 10
+INFO    = 20
+WARNING = 30
+ERROR   = 40
 
 class Log:
-    def __init__( self, log_file: str=None ):
+    def __init__( self, log_file: str=None, level: int=INFO, buffer_size: Optional[int]=256 ):
         self.file = open( log_file, 'w' ) if log_file else None
+        self.level = level
         self.scope = 0
         self.errors = 0
         self.warnings = 0
 
+        # messages are buffered and written out in batches of buffer_size
+        # lines, or never when buffer_size is None (see take()). Owners
+        # call close() when done so the tail of the buffer is written
+        self.buffer = []
+        self.buffer_size = buffer_size
+
     def indent( self ):
         return Indent( self )
 
-    def error( self, *args, **kwargs ):
+    def enabled( self, level: int ):
+        return level >= self.level
+
+    def error( self, *args ):
         self.errors += 1
-        self.info( '[ERROR]: ', *args, **kwargs )
+        self.emit( ERROR, '[ERROR]: ', *args )
+        self.flush()
 
-    def warning( self, *args, **kwargs ):
+    def warning( self, *args ):
         self.warnings += 1
-        self.info( '[WARNING]: ', *args, **kwargs )
+        self.emit( WARNING, '[WARNING]: ', *args )
+
+    def info( self, *args ):
+        self.emit( INFO, *args )
+
+    def debug( self, *args ):
+        self.emit( DEBUG, *args )
+
+    def emit( self, level: int, *args ):
+        if level < self.level:
+            return
+        self.write( ' '*self.scope + ' ' + ' '.join( str(a) for a in args ) + '\n' )
 
-    def info( self, *args, **kwargs ):
-        with io.StringIO() as out:
-            print( ' '*self.scope, *args, file=out, end=None )
-            contents = out.getvalue()
-        print( contents.rstrip() )
+    def write( self, contents: str ):
+        self.buffer.append( contents )
+        if self.buffer_size is not None and len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def take( self ):
+        # returns and clears buffered output
+        contents = ''.join( self.buffer )
+        self.buffer.clear()
+        return contents
+
+    def flush( self ):
+        if not self.buffer or self.buffer_size is None:
+            return
+        contents = self.take()
+        sys.stdout.write( contents )
+        sys.stdout.flush()
         if self.file is not None:
             self.file.write( contents )
+            self.file.flush()
+
+    def close( self ):
+        self.flush()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def replay( self, contents: str, errors: int, warnings: int, result: Any=None ):
+        # emit output captured from a worker process
+        self.errors += errors
+        self.warnings += warnings
+        if contents:
+            self.write( contents )
+        return result
 
 class Indent(object):
     def __init__( self, log: Log ):
@@ -34,4 +90,4 @@ class Indent(object):
         self.log.scope += 1
 
     def __exit__( self, type, value, traceback ):
-        self.log.scope -= 1
\ No newline at end of file
+        self.log.scope -= 1
@@ -0,0 +1,98 @@
+from typing import *
+import json
+import os
+import socket
+import socketserver
+import sys
+
+from .log import Log
+from .stats import Stats
+from .illiterally import build
+
+if TYPE_CHECKING:
+    from .state import State
+
+# Build server holding a State, its block index, dependency graph and
+# compiled templates in memory between builds. Clients connect to a unix
+# socket and send one JSON request per line, each answered by one JSON
+# response line:
+#
+#   {"command": "build"}                          re-render out of date outputs
+#   {"command": "render", "template": "file.md"}  re-render a single output
+#   {"command": "shutdown"}                       stop the server
+#
+# Responses carry the exit status of the build along with its log output
+# and error/warning counts: {"status": 0, "log": "...", "errors": 0, "warnings": 0}
+class BuildServer( socketserver.UnixStreamServer ):
+    def __init__( self, S: 'State', socket_path: str ):
+        self.state = S
+        self.socket_path = socket_path
+        self.running = True
+        super().__init__( socket_path, BuildRequestHandler )
+
+    def run( self, request: dict ):
+        S = self.state
+        command = request.get('command')
+        if command == 'shutdown':
+            self.running = False
+            return dict( status=0 )
+        if command not in ['build','render']:
+            return dict( status=1, log=f'Unknown command "{command}".\n' )
+
+        template_files = None
+        if command == 'render':
+            template_file = os.path.abspath( request.get('template') or '' )
+            if template_file not in S.template_files:
+                return dict( status=1, log=f'"{template_file}" is not one of the served templates.\n' )
+            template_files = [template_file]
+
+        # capture the log of each request so it can be sent back
+        S.log = Log( level=S.log_level, buffer_size=None )
+        S.stats = Stats()
+        status = build( S, template_files )
+        return dict( status=status, log=S.log.take(), errors=S.log.errors, warnings=S.log.warnings )
+
+class BuildRequestHandler( socketserver.StreamRequestHandler ):
+    def handle( self ):
+        for line in self.rfile:
+            try:
+                response = self.server.run( json.loads( line ) )
+            except Exception as e:
+                response = dict( status=1, log=f'[ERROR]: {type(e).__name__}: {e}\n' )
+            self.wfile.write( (json.dumps( response ) + '\n').encode() )
+            self.wfile.flush()
+            if not self.server.running:
+                return
+
+def serve( S: 'State', socket_path: str ):
+    # an initial build warms the index, dependency graph and templates,
+    # requests replace S.log so the startup log is kept to be closed
+    log = S.log
+    build( S )
+    if os.path.exists( socket_path ):
+        os.remove( socket_path )
+    server = BuildServer( S, socket_path )
+    S.log.info(f'Serving builds on {socket_path}, press Ctrl-C to stop...')
+    S.log.flush()
+    try:
+        while server.running:
+            server.handle_request()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove( socket_path )
+        log.close()
+    return 0
+
+def client( socket_path: str, command: str, **kwargs ):
+    with socket.socket( socket.AF_UNIX, socket.SOCK_STREAM ) as sock:
+        sock.connect( socket_path )
+        with sock.makefile('rwb') as f:
+            f.write( (json.dumps( dict( command=command, **kwargs ) ) + '\n').encode() )
+            f.flush()
+            response = json.loads( f.readline() )
+    if response.get('log'):
+        sys.stdout.write( response['log'] )
+        sys.stdout.flush()
+    return response['status']
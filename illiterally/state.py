@@ -1,22 +1,38 @@
 from typing import *
+import concurrent.futures
+import filecmp
+import functools
+import hashlib
 import os
+import time
 import jinja2
+import jinja2.meta
 
-from .log import Log, Indent
-from .utils import data_file, read_file
-from .block import Block, BlockReader
+from .log import Log, Indent, DEBUG, INFO
+from .utils import data_file
+from .block import Block, BlockReader, LinkTable
+from .cache import IndexCache, FragmentCache, IncludeCache
+from .deps import DependencyGraph, OutputDependencies
+from .index import BlockIndex
+from .discover import discover_sources, is_glob
+from .stats import Stats
 
 class State:
-    def __init__( self, source_files: list[str], template_files: list[str], block_template: str, output_dir: str='./output', source_prefix: Optional[str]=None, template_prefix: Optional[str]=None, left:str=None, right:str=None, suppress:bool=False, log_file:str=None ):
+    def __init__( self, source_files: list[str], template_files: list[str], block_template: str, output_dir: str='./output', source_prefix: Optional[str]=None, template_prefix: Optional[str]=None, left:str=None, right:str=None, suppress:bool=False, log_file:str=None, cache:bool=False, cache_dir:str=None, jobs:int=1, log_level:int=INFO, stats:Stats=None, include:list[str]=None, exclude:list[str]=None, extensions:list[str]=None, max_size:int=None, ignore_files:list[str]=None ):
         # log file
-        self.log = Log( log_file )
+        self.log_level = log_level
+        self.stats = stats or Stats()
+        self.log = Log( log_file, level=log_level )
         self.log.info('Starting 🔥')
 
         # source files contain the source of blocks and source_prefix
-        # defines the root directory with which relative paths are defined
-        self.source_files = [os.path.abspath(f) for f in source_files]
-        self.source_prefix = source_prefix or os.path.commonprefix([os.path.dirname(f) for f in self.source_files])
-    
+        # defines the root directory with which relative paths are defined.
+        # Directory and glob sources are expanded into the files they contain
+        # and re-scanned by every later build (see parse_blocks)
+        self.sources = [os.path.abspath(f) for f in source_files]
+        self.discover_options = dict( include=include, exclude=exclude, extensions=extensions, max_size=max_size, ignore_files=ignore_files )
+        self.source_dirs = []
+
         # template files are the unprocessed 'output files' and the
         # template prefix defines the root directory with which 
         # relative paths are defined
@@ -31,6 +47,17 @@ class State:
         self.output_dir   = os.path.abspath( output_dir )
         self.output_files = [ os.path.abspath(os.path.join( self.output_dir, os.path.relpath(f,self.template_prefix))) for f in self.template_files ]
 
+        # persistent caches live under the output directory unless
+        # a separate cache directory is provided
+        self.cache_dir = os.path.abspath( cache_dir ) if cache_dir else os.path.join( self.output_dir, '.illiterally' )
+
+        # the build's own files are never scanned as sources, e.g. when the
+        # output directory lies inside a scanned source directory
+        self.discover_skip = [ self.output_dir, self.cache_dir, *self.output_files, *self.template_files, self.block_template_file ]
+        self.source_files = self.discover_source_files()
+        self.source_files_stale = False
+        self.source_prefix = source_prefix or os.path.commonprefix([os.path.dirname(f) for f in self.source_files])
+
         # check that we're not going to clobber inputs
         with self.log.indent():
             input_files = set([*self.source_files,*self.template_files,self.block_template_file])
@@ -38,8 +65,17 @@ class State:
                 if o in input_files:
                     self.log.error('Output file "{o}" would overwrite source/template/block file.')
 
-        self.env = jinja2.Environment(loader=jinja2.FileSystemLoader(self.template_search_paths))
-        self.blk_template = self.env.from_string( open(self.block_template_file).read() )
+        self.index_cache = IndexCache( os.path.join( self.cache_dir, 'index.json' ) ) if cache else None
+        self.deps = DependencyGraph( os.path.join( self.cache_dir, 'deps.json' ) ) if cache else None
+        self.template_deps = {}
+        self.fragments = FragmentCache( os.path.join( self.cache_dir, 'fragments' ) ) if cache else None
+        self.fingerprints = {}
+        self.includes = IncludeCache()
+        self.links = LinkTable()
+
+        self.cache = cache
+        self.env = self.create_environment()
+        self.blk_template = self.env.get_template( self.block_template_file )
 
         # the left and right delimiters, if auto-detection is not used
         self.left = left
@@ -48,45 +84,201 @@ class State:
         # output delimiter suppression
         self.suppress = suppress
 
-    def parse_blocks( self, induplicates: Set[str]=None ):
-        with self.log.indent():
-            if induplicates is None:
-                self.log.info('Building active slug index...')
+        # number of worker processes, 0 uses all available cores
+        self.jobs = jobs if jobs > 0 else (os.cpu_count() or 1)
+        self.log.flush()
+
+    def discover_source_files( self ):
+        if not any( os.path.isdir(f) or is_glob(f) for f in self.sources ):
+            return list( self.sources )
+        with self.log.indent(), self.stats.phase('discover'):
+            # scanned directories are kept so watchers notice new files
+            self.source_dirs = []
+            source_files = discover_sources( self.sources, directories=self.source_dirs, skip=self.discover_skip, **self.discover_options )
+            self.log.info(f'Discovered {len(source_files)} source file(s).')
+            if len(source_files) == 0:
+                self.log.warning('Warning: No source files found.')
+        return source_files
+
+    def create_environment( self ):
+        # templates are compiled once and shared by the activate and render
+        # passes. Output templates are loaded by absolute path, everything
+        # else (e.g. imported macros) through the template search paths
+        bytecode_cache = None
+        if self.cache:
+            os.makedirs( os.path.join( self.cache_dir, 'jinja' ), exist_ok=True )
+            bytecode_cache = jinja2.FileSystemBytecodeCache( os.path.join( self.cache_dir, 'jinja' ) )
+        return jinja2.Environment(
+            loader = jinja2.ChoiceLoader([ jinja2.FunctionLoader( self.load_template_file ), jinja2.FileSystemLoader( self.template_search_paths ) ]),
+            cache_size = len(self.template_files) + 400,
+            bytecode_cache = bytecode_cache
+        )
+
+    # states are sent to render worker processes without their log,
+    # caches and compiled templates, which each worker recreates
+    def __getstate__( self ):
+        state = self.__dict__.copy()
+        for key in ['log','stats','env','blk_template','index_cache','deps','template_deps','fragments','includes']:
+            del state[key]
+        return state
+
+    def __setstate__( self, state ):
+        self.__dict__.update( state )
+        self.log = Log( level=self.log_level, buffer_size=None )
+        self.stats = Stats()
+        self.env = self.create_environment()
+        self.blk_template = self.env.get_template( self.block_template_file )
+        self.index_cache = None
+        self.deps = None
+        self.template_deps = {}
+        self.fragments = FragmentCache( os.path.join( self.cache_dir, 'fragments' ) ) if self.cache else None
+        self.includes = IncludeCache()
+
+    @staticmethod
+    def load_template_file( name: str ):
+        if not os.path.isabs( name ) or not os.path.isfile( name ):
+            return None
+        mtime = os.path.getmtime( name )
+        with open( name ) as f:
+            source = f.read()
+        return source, name, lambda: os.path.isfile( name ) and os.path.getmtime( name ) == mtime
+
+    def template_dependencies( self, name: str ) -> Set[str]:
+        # the template file and every template it imports, includes or extends
+        if name not in self.template_deps:
+            try:
+                source,filename,_ = self.env.loader.get_source( self.env, name )
+            except jinja2.TemplateNotFound:
+                return set()
+            files = self.template_deps[name] = set([os.path.abspath(filename)])
+            for ref in jinja2.meta.find_referenced_templates( self.env.parse(source) ):
+                if ref is not None:
+                    files |= self.template_dependencies( ref )
+        return self.template_deps[name]
+
+    def index_source_files( self, source_files: list[str] ):
+        # cached indexes are loaded serially, everything else is parsed
+        # across worker processes and returned in the input order
+        indexed = {}
+        pending = []
+        for source_file in source_files:
+            if self.index_cache is not None:
+                start = time.perf_counter()
+                hit,file_blocks = self.index_cache.lookup( source_file, self.left, self.right, self.suppress )
+                if hit:
+                    self.stats.add_source_file( source_file, time.perf_counter()-start, len(file_blocks or []), True )
+                    indexed[source_file] = file_blocks
+                    continue
+            pending.append( source_file )
+
+        index_blocks = functools.partial( _timed_index_blocks, left=self.left, right=self.right, suppress=self.suppress, signed=self.index_cache is not None )
+        if self.jobs > 1 and len(pending) > 1:
+            chunksize = max( 1, len(pending)//(4*self.jobs) )
+            with concurrent.futures.ProcessPoolExecutor( max_workers=self.jobs ) as pool:
+                parsed = list( pool.map( index_blocks, pending, chunksize=chunksize ) )
+        else:
+            parsed = [ index_blocks( source_file ) for source_file in pending ]
+
+        for source_file,(file_blocks,seconds,signature,error) in zip( pending, parsed ):
+            self.stats.add_source_file( source_file, seconds, len(file_blocks or []), False )
+            if error is not None:
+                # binary or otherwise undecodable files are skipped, not cached
+                # so that they are retried once they become readable
+                with self.log.indent():
+                    self.log.warning(f'Warning: Skipping unreadable source file "{source_file}": {error}')
+            elif self.index_cache is not None:
+                self.index_cache.store( source_file, self.left, self.right, self.suppress, file_blocks, signature )
+            indexed[source_file] = file_blocks
+        return [ (source_file,indexed[source_file]) for source_file in source_files ]
+
+    def merge_file_blocks( self, blocks: Dict[str,Block], duplicates: Set[str], source_file: str, file_blocks: Dict[str,Block] ):
+        self.log.info(f'Processing file: "{source_file}", {len(file_blocks)} block(s)...')
+        verbose = self.log.enabled( DEBUG )
+        for slug,block in file_blocks.items():
+            if slug in blocks:
+                with self.log.indent():
+                    self.log.warning(f'Warning: Block with slug "{slug}" already exists.')
+                duplicates.add(slug)
             else:
-                self.log.info('De-duplicating slugs & rebuilding index...')
+                if verbose:
+                    with self.log.indent():
+                        self.log.debug(f'Found block at line {block.line}: {block.slug} = "{block.name}".')
+                blocks[slug] = block
+
+    def parse_blocks( self ):
+        # the State may be reused by the watcher or build server, pick up
+        # source files added to scanned directories since the last build
+        if self.source_files_stale:
+            self.source_files = self.discover_source_files()
+        self.source_files_stale = True
+        with self.log.indent():
+            self.log.info('Building active slug index...')
+            indexed = []
             blocks = dict()
             duplicates = set()
-            with self.log.indent():
-                for source_file in sorted( self.source_files ):
-                    file_blocks = BlockReader.index_blocks( source_file, duplicates=induplicates, left=self.left, right=self.right, suppress=self.suppress )
+            with self.log.indent(), self.stats.phase('parse'):
+                for source_file,file_blocks in self.index_source_files( sorted( self.source_files ) ):
                     if file_blocks is None:
-                        self.log.info(f'No blocks found in {source_file}, skipping.')
+                        self.log.debug(f'No blocks found in {source_file}, skipping.')
                         continue
-                    self.log.info(f'Processing file: "{source_file}"...')
-                    for slug,block in file_blocks.items():
-                        with self.log.indent():
-                            if slug in blocks:
-                                self.log.warning(f'Warning: Block with slug "{slug}" already exists.')
-                                duplicates.add(slug)
-                            else:
-                                self.log.info(f'Found block at line {block.line}: {block.slug} = "{block.name}".')
-                                blocks[slug] = block  
-                if induplicates and len(duplicates) > 0:
-                    self.log.error('Error: Duplicate slugs found during de-duplication. How???')
+                    indexed.append( (source_file,file_blocks) )
+                    self.merge_file_blocks( blocks, duplicates, source_file, file_blocks )
+                self.log.info(f'Found {len(blocks)} block(s) in {len(indexed)} of {len(self.source_files)} source file(s).')
+                if self.index_cache is not None:
+                    self.index_cache.save()
+                    self.stats.counters['index_cache'] = dict( hits=self.index_cache.hits, misses=self.index_cache.misses )
+
+            if len(duplicates) > 0:
+                # rename colliding slugs in place rather than re-parsing
+                self.log.info('De-duplicating slugs & rebuilding index...')
+                induplicates = duplicates
+                blocks = dict()
+                duplicates = set()
+                with self.log.indent(), self.stats.phase('deduplicate'):
+                    for source_file,file_blocks in indexed:
+                        file_blocks = BlockReader.rename_blocks( file_blocks, induplicates )
+                        self.merge_file_blocks( blocks, duplicates, source_file, file_blocks )
+                    if len(duplicates) > 0:
+                        self.log.error('Error: Duplicate slugs found during de-duplication. How???')
+        self.log.flush()
 
         return blocks,duplicates
 
-    def block_from_slug( self, blocks: Dict[str,Block], slug: str ):
+    def save_index( self, blocks: Dict[str,Block], index_file: str ):
         with self.log.indent():
-            if slug in blocks:
-                return blocks[slug]
-            self.log.warning(f'Warning: Referenced non-existent slug "{slug}".')
-            return None
+            self.log.info(f'Writing block index to "{index_file}"...')
+            BlockIndex.save( index_file, blocks, dict( left=self.left, right=self.right, suppress=self.suppress ) )
+        self.log.flush()
+
+    def load_index( self, index_file: str ) -> Optional[Dict[str,Block]]:
+        with self.log.indent():
+            self.log.info(f'Loading block index from "{index_file}"...')
+            with self.log.indent(), self.stats.phase('load-index'):
+                try:
+                    blocks,settings = BlockIndex.load( index_file )
+                except ValueError as e:
+                    self.log.error(f'Error: {e}')
+                    return None
+                if settings['suppress'] != self.suppress:
+                    self.log.warning(f'Warning: Block index was written with suppress={settings["suppress"]}.')
+                self.log.info(f'Loaded {len(blocks)} block(s).')
+        self.log.flush()
+        return blocks
+
+    def block_from_slug( self, blocks: Dict[str,Block], slug: str ):
+        # called for every link in every template, only pay for the log
+        # indent when there's something to warn about
+        blk = blocks.get( slug )
+        if blk is None:
+            with self.log.indent():
+                self.log.warning(f'Warning: Referenced non-existent slug "{slug}".')
+        return blk
     
     def activate_block_by_slug( self, blocks: Dict[str,Block], slug: str, into: str ):
         with self.log.indent():
             if slug in blocks:
-                self.log.info(f'Activated slug {slug} for template "{into}".')
+                if self.log.enabled( DEBUG ):
+                    self.log.debug(f'Activated slug {slug} for template "{into}".')
                 blk = blocks[slug]
                 if blk.rendered_into is not None:
                     self.log.error(f'Block {slug} already activated by "{blk.rendered_into}".')
@@ -96,40 +288,201 @@ class State:
                 self.log.warning(f'Referenced non-existent slug "{slug}".')
             return None
 
-    def render_block_by_slug( self, blocks: Dict[str,Block], slug: str, into: str ):
+    def render_block_by_slug( self, blocks: Dict[str,Block], slug: str, into: str, deps: OutputDependencies ):
         with self.log.indent():
             if slug in blocks:
                 if blocks[slug].rendered_into != into:
                     self.log.error(f'Block {slug} already rendered by "{blocks[slug].rendered_into}".')
                     return None
-                self.log.info(f'Rendered block {slug} for template "{into}".')
-                return self.blk_template.render( __file__ = into, slug=slug, block=lambda slug: self.block_from_slug( blocks, slug ), blocks=blocks, suppress=self.suppress )
+                if self.log.enabled( DEBUG ):
+                    self.log.debug(f'Rendered block {slug} for template "{into}".')
+                return self.render_fragment( blocks, slug, into, deps )
             else:
                 self.log.warning(f'Referenced non-existent slug "{slug}".')
                 return None
 
+    def render_fragment( self, blocks: Dict[str,Block], slug: str, into: str, deps: OutputDependencies ):
+        if self.fragments is None:
+            return self.blk_template.render( __file__ = into, slug=slug, block=lambda slug: self.lookup_block( blocks, slug, deps ), blocks=blocks, suppress=self.suppress )
+
+        # fragments are keyed on the block itself and validated against
+        # every block the block template looked up when it was rendered
+        key = self.fragments.key( self.block_fingerprint( blocks, slug ), self.blk_signature, into, self.suppress )
+        entry = self.fragments.get( key )
+        if entry is not None and all( self.block_fingerprint( blocks, s ) == fp for s,fp in entry['blocks'].items() ):
+            self.fragments.hits += 1
+            deps.slugs.update( entry['blocks'] )
+            return entry['text']
+        self.fragments.misses += 1
+        fragment_deps = OutputDependencies()
+        text = self.blk_template.render( __file__ = into, slug=slug, block=lambda slug: self.lookup_block( blocks, slug, fragment_deps ), blocks=blocks, suppress=self.suppress )
+        deps.slugs |= fragment_deps.slugs
+        self.fragments.put( key, dict( blocks={ s: self.block_fingerprint( blocks, s ) for s in sorted(fragment_deps.slugs) }, text=text ) )
+        return text
+
+    def block_fingerprint( self, blocks: Dict[str,Block], slug: str ):
+        # blocks don't change while rendering, so fingerprints are computed once per pass
+        if slug not in self.fingerprints:
+            self.fingerprints[slug] = DependencyGraph.block_fingerprint( blocks.get(slug) )
+        return self.fingerprints[slug]
+
+    def template_signature( self, name: str ):
+        h = hashlib.sha1()
+        for filename in sorted( self.template_dependencies( name ) ):
+            with open( filename, 'rb' ) as f:
+                h.update( filename.encode() + b'\0' + f.read() + b'\0' )
+        return h.hexdigest()
+
+    def lookup_block( self, blocks: Dict[str,Block], slug: str, deps: OutputDependencies ):
+        deps.slugs.add( slug )
+        return self.block_from_slug( blocks, slug )
+
+    def include_file( self, template: str, file: str, deps: OutputDependencies ):
+        filename = os.path.abspath( os.path.join( os.path.dirname(template), file ) )
+        deps.files.add( filename )
+        return self.includes.read( filename )
+
     def activate_callbacks( self, blocks: Dict[str,Block], into: str, template: str ):
         return dict( __file__ = into, block = lambda slug: self.block_from_slug(blocks,slug), render_block = lambda slug: self.activate_block_by_slug( blocks, slug, into ), include_file = lambda x: x )
     
-    def render_callbacks( self, blocks: Dict[str,Block], into: str, template: str  ):
-        return dict( __file__ = into, block = lambda slug: self.block_from_slug(blocks,slug), render_block = lambda slug: self.render_block_by_slug( blocks, slug, into ), include_file = lambda x: read_file( os.path.dirname(template), x ) )
+    def render_callbacks( self, blocks: Dict[str,Block], into: str, template: str, deps: OutputDependencies ):
+        return dict( __file__ = into, block = lambda slug: self.lookup_block(blocks,slug,deps), render_block = lambda slug: deps.slugs.add(slug) or self.render_block_by_slug( blocks, slug, into, deps ), include_file = lambda x: self.include_file( template, x, deps ) )
 
     def activate_blocks_from_templates( self, blocks: Dict[str,Block] ):
         with self.log.indent():
             self.log.info('Activating blocks from templates...')
-            with self.log.indent():
+            with self.log.indent(), self.stats.phase('activate'):
                 for template_file,output_file in zip(self.template_files,self.output_files):
                     self.log.info(f'Template file: {template_file}...')
-                    template = self.env.from_string( open(template_file).read() )
+                    template = self.env.get_template( template_file )
                     template.render( **self.activate_callbacks( blocks, output_file, template_file ) )
+        self.log.flush()
+
+    def render_output( self, blocks: Dict[str,Block], template_file: str, output_file: str ):
+        '''Renders a template and returns (deps,updated), the output file is left untouched if its contents didn't change'''
+        deps = OutputDependencies()
+        if self.cache:
+            deps.files = self.template_dependencies(template_file) | self.template_dependencies(self.block_template_file)
+        start = time.perf_counter()
+        include_hits,include_misses = self.includes.hits,self.includes.misses
+        fragment_hits,fragment_misses = (self.fragments.hits,self.fragments.misses) if self.fragments is not None else (0,0)
+        os.makedirs( os.path.dirname(output_file), exist_ok=True )
+        template = self.env.get_template( template_file )
+
+        # stream into a temporary file next to the output so that large
+        # documents never exist as one string and replacing it is atomic
+        tmp_file = output_file + '.tmp'
+        try:
+            with open( tmp_file, 'w' ) as outf:
+                outf.writelines( template.generate( **self.render_callbacks( blocks, output_file, template_file, deps ) ) )
+            with self.stats.phase('write'):
+                write_start = time.perf_counter()
+                updated = not os.path.isfile( output_file ) or not filecmp.cmp( tmp_file, output_file, shallow=False )
+                if updated:
+                    os.replace( tmp_file, output_file )
+                else:
+                    os.remove( tmp_file )
+                write_seconds = time.perf_counter() - write_start
+        except BaseException:
+            if os.path.exists( tmp_file ):
+                os.remove( tmp_file )
+            raise
+        self.stats.add_template( template_file, output_file, time.perf_counter()-start, write_seconds, updated )
+        if self.includes.hits + self.includes.misses > include_hits + include_misses:
+            self.stats.add_counters( 'include_cache', hits=self.includes.hits-include_hits, misses=self.includes.misses-include_misses )
+        if self.fragments is not None:
+            # recorded per output so counts from render workers are merged too
+            self.stats.add_counters( 'fragment_cache', hits=self.fragments.hits-fragment_hits, misses=self.fragments.misses-fragment_misses )
+        return deps, updated
 
-    def render_blocks_from_templates( self, blocks: Dict[str,Block] ):
+    def render_blocks_from_templates( self, blocks: Dict[str,Block], template_files: Optional[list[str]]=None ):
         with self.log.indent():
             self.log.info('Rendering blocks from templates...')
-            with self.log.indent():
-                for template_file,output_file in zip(self.template_files,self.output_files):
+            # pick up template changes when the state is reused between builds
+            self.blk_template = self.env.get_template( self.block_template_file )
+            self.template_deps = {}
+            self.fingerprints = {}
+            self.blk_signature = self.template_signature( self.block_template_file ) if self.fragments is not None else None
+            # share one table of relative links between all blocks and outputs
+            for blk in blocks.values():
+                blk.links = self.links
+            with self.log.indent(), self.stats.phase('render'):
+                # optionally only render a subset, activation still covers every template
+                outputs = [ (t,o) for t,o in zip(self.template_files,self.output_files) if template_files is None or t in template_files ]
+                fingerprint = functools.partial( self.block_fingerprint, blocks )
+                pending = [ (t,o) for t,o in outputs if self.deps is None or not self.deps.is_up_to_date( o, fingerprint, self.suppress, self.block_template_file ) ]
+                stale_outputs = set( o for _,o in pending )
+
+                # activation has fixed where every block renders, so outputs are
+                # independent and can be rendered by workers sharing the block
+                # index. Worker logs are replayed in template order.
+                results = {}
+                if self.jobs > 1 and len(pending) > 1:
+                    with concurrent.futures.ProcessPoolExecutor( max_workers=self.jobs, initializer=_init_render_worker, initargs=(self,blocks) ) as pool:
+                        pending_templates,pending_outputs = zip(*pending)
+                        results = dict( zip( pending_outputs, pool.map( _render_worker, pending_templates, pending_outputs, [self.log.scope]*len(pending) ) ) )
+
+                updated = []
+                for template_file,output_file in outputs:
+                    if output_file not in stale_outputs:
+                        self.log.debug(f'Output "{output_file}" is up to date, skipping.')
+                        continue
                     self.log.info(f'Template file: {template_file}...')
-                    os.makedirs( os.path.dirname(output_file), exist_ok=True )
-                    template = self.env.from_string( open(template_file).read() )
-                    with open( output_file, 'w' ) as outf:
-                        outf.write( template.render( **self.render_callbacks( blocks, output_file, template_file ) ) )
\ No newline at end of file
+                    if output_file in results:
+                        deps,output_updated,stats,fragments_written = self.log.replay( *results[output_file] )
+                        self.stats.merge( stats )
+                        if fragments_written:
+                            # workers write to the shared fragment directory,
+                            # the parent evicts from it once all are done
+                            self.fragments.written = True
+                    else:
+                        deps,output_updated = self.render_output( blocks, template_file, output_file )
+                    if output_updated:
+                        updated.append( output_file )
+                    if self.deps is not None:
+                        self.deps.record( output_file, deps, fingerprint, self.suppress, self.block_template_file )
+                if len(pending) < len(outputs):
+                    self.log.info(f'Rendered {len(pending)} of {len(outputs)} output(s), the rest are up to date.')
+                if pending:
+                    self.log.info(f'Updated {len(updated)} of {len(pending)} rendered output(s){":" if updated else "."}')
+                    with self.log.indent():
+                        for output_file in updated:
+                            self.log.info( output_file )
+                self.stats.counters['outputs'] = dict( rendered=len(pending), up_to_date=len(outputs)-len(pending), updated=len(updated) )
+                if self.deps is not None:
+                    self.deps.save()
+                if self.fragments is not None:
+                    self.fragments.save()
+                    self.stats.counters.setdefault( 'fragment_cache', dict( hits=0, misses=0 ) )
+        self.log.flush()
+
+# per-process state of render workers
+_render_state = None
+
+def _init_render_worker( state: State, blocks: Dict[str,Block] ):
+    global _render_state
+    _render_state = (state,blocks)
+
+def _render_worker( template_file: str, output_file: str, scope: int ):
+    state,blocks = _render_state
+    state.log = Log( level=state.log_level, buffer_size=None )
+    state.log.scope = scope
+    state.stats = Stats()
+    deps,updated = state.render_output( blocks, template_file, output_file )
+    fragments_written = state.fragments is not None and state.fragments.written
+    return state.log.take(), state.log.errors, state.log.warnings, (deps,updated,state.stats,fragments_written)
+
+def _timed_index_blocks( source_file: str, signed: bool=False, **kwargs ):
+    # the file is stat'ed before it is read so that an edit racing the
+    # parse leaves a stale mtime behind rather than a stale index, and the
+    # signature hashes exactly the text that was parsed
+    start = time.perf_counter()
+    st = os.stat( source_file )
+    try:
+        with open( source_file ) as f:
+            text = f.read()
+    except UnicodeDecodeError as e:
+        return None, time.perf_counter()-start, None, str(e)
+    file_blocks = BlockReader.index_blocks( source_file, text=text, **kwargs )
+    signature = (st.st_size, st.st_mtime_ns, IndexCache.text_hash( text )) if signed else None
+    return file_blocks, time.perf_counter()-start, signature, None
@@ -0,0 +1,63 @@
+from typing import *
+import contextlib
+import json
+import os
+import time
+
+# Machine-readable build statistics: wall and cpu time for each phase,
+# per source file parse times and block counts, per template render times
+# and assorted counters (cache hits, outputs written, ...). Cpu times are
+# for the main process only and don't include worker processes.
+class Stats:
+    version = 1
+
+    def __init__( self ):
+        self.phases = {}
+        self.source_files = {}
+        self.templates = {}
+        self.counters = {}
+
+    @contextlib.contextmanager
+    def phase( self, name: str ):
+        wall,cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            self.add_phase( name, time.perf_counter()-wall, time.process_time()-cpu )
+
+    def add_phase( self, name: str, wall: float, cpu: float ):
+        phase = self.phases.setdefault( name, dict( wall=0.0, cpu=0.0, count=0 ) )
+        phase['wall'] += wall
+        phase['cpu'] += cpu
+        phase['count'] += 1
+
+    def add_source_file( self, source_file: str, seconds: float, blocks: int, cached: bool ):
+        self.source_files[source_file] = dict( seconds=seconds, blocks=blocks, cached=cached )
+
+    def add_template( self, template_file: str, output_file: str, seconds: float, write_seconds: float, updated: bool ):
+        self.templates[template_file] = dict( output=output_file, seconds=seconds, write_seconds=write_seconds, updated=updated )
+
+    def add_counters( self, name: str, **values: int ):
+        counters = self.counters.setdefault( name, {} )
+        for key,value in values.items():
+            counters[key] = counters.get( key, 0 ) + value
+
+    def merge( self, other: 'Stats' ):
+        # fold in statistics gathered by a worker process
+        for name,phase in other.phases.items():
+            merged = self.phases.setdefault( name, dict( wall=0.0, cpu=0.0, count=0 ) )
+            for key in merged:
+                merged[key] += phase[key]
+        self.source_files.update( other.source_files )
+        self.templates.update( other.templates )
+        for name,counters in other.counters.items():
+            self.add_counters( name, **counters )
+
+    def as_dict( self ):
+        return dict( version=self.version, phases=self.phases, source_files=self.source_files, templates=self.templates, counters=self.counters )
+
+    def save( self, stats_file: str ):
+        if os.path.dirname( stats_file ):
+            os.makedirs( os.path.dirname(stats_file), exist_ok=True )
+        with open( stats_file, 'w' ) as f:
+            json.dump( self.as_dict(), f, indent=2 )
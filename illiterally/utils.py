@@ -9,5 +9,6 @@ def data_file( *args ):
 
 def read_file( prefix, file ):
     fname = os.path.join( prefix, file )
-    return open( fname ).read()
+    with open( fname ) as f:
+        return f.read()
 # 🚗
\ No newline at end of file
@@ -0,0 +1,137 @@
+import os
+import sys
+import pickle
+
+import illiterally as ill
+
+from utils import run_in_temp_directory
+
+@run_in_temp_directory()
+def test_iter_blocks( test_dir: str=None ):
+    with open( 'nested.txt', 'w' ) as f:
+        f.write( '<<<: Outer\na\n<<<: Inner\nb\n:>>>\nc\n:>>>\n<<<: Open\nd\n<<<: Also open\ne\n' )
+
+    reader = ill.BlockReader( 'nested.txt', left='<<<:', right=':>>>' )
+    blocks = list( reader.iter_blocks() )
+    # blocks are yielded as they close, unclosed blocks innermost first at the end
+    assert [ blk.slug for blk in blocks ] == ['inner','outer','also-open','open']
+    assert blocks[1].nested == ['inner'] and blocks[3].nested == ['also-open']
+    assert blocks[1].text == 'a\n<<<: Inner :>>>' + os.linesep + 'c\n'
+    assert blocks[0].buffer is blocks[1].buffer and blocks[2].buffer is not blocks[1].buffer
+
+    with open( 'stray.txt', 'w' ) as f:
+        f.write( '<<<: First\na\n:>>>\n:>>>\n<<<: Ignored\nb\n:>>>\n' )
+    assert list( ill.BlockReader.index_blocks( 'stray.txt', left='<<<:', right=':>>>' ) ) == ['first']
+
+@run_in_temp_directory()
+def test_block_spans( test_dir: str=None ):
+    with open( 'spans.txt', 'w' ) as f:
+        f.write( 'preamble\n<<<: Outer\na\n<<<: Inner\nb\n:>>>\nc\nd\n:>>>\nafter\n' )
+
+    blocks = ill.BlockReader.index_blocks( 'spans.txt', left='<<<:', right=':>>>' )
+    outer,inner = blocks['outer'],blocks['inner']
+    # each kept line is buffered once, text outside blocks is dropped and
+    # consecutive lines of a block share a span
+    assert outer.buffer is inner.buffer
+    assert outer.buffer == [ 'a\n', '<<<: Inner :>>>' + os.linesep, 'b\n', 'c\n', 'd\n' ]
+    assert list(outer.spans) == [0,2,3,5] and list(inner.spans) == [2,3]
+    assert outer.text == 'a\n<<<: Inner :>>>' + os.linesep + 'c\nd\n'
+    assert inner.text == 'b\n'
+
+    # text is joined from the buffer when it's read
+    outer.buffer[3] = 'C\n'
+    assert outer.text == 'a\n<<<: Inner :>>>' + os.linesep + 'C\nd\n'
+
+    # rendered output is the text of each block, byte for byte
+    with open( 'text.block', 'w' ) as f:
+        f.write( '{{ block(slug).text }}' )
+    with open( 'spans.out', 'w' ) as f:
+        f.write( "{{ render_block('outer') }}|{{ render_block('inner') }}" )
+    assert ill.illiterally( source_files=['spans.txt'], template_files=['spans.out'], block_template='text.block', left='<<<:', right=':>>>', output_dir='output' ) == 0
+    with open( 'output/spans.out', newline='' ) as f:
+        assert f.read() == 'a\n<<<: Inner :>>>' + os.linesep + 'c\nd\n|b\n'
+
+@run_in_temp_directory()
+def test_demojize_fast_path( test_dir: str=None ):
+    import emoji
+    import illiterally.block
+    lines = [ 'plain ascii\n', '🔥 Ünïcödé name\n', 'naïve café, 日本語\n', 'mixed 🚀 and 🐍 emoji\n', '  :fire: already an alias\n', '🧯\n', '🔥 Inner 👋🏽\n', 'x = "∑ 🧯"\n', '🧯\n', 'tail 🎉\n' ]
+    for line in lines:
+        assert ill.delimiters.demojize( line ) == emoji.demojize( line )
+
+    with open( 'mixed.txt', 'w' ) as f:
+        f.writelines( lines )
+    fast = ill.BlockReader.index_blocks( 'mixed.txt', left='🔥', right='🧯' )
+    demojize = illiterally.block.demojize
+    illiterally.block.demojize = emoji.demojize
+    try:
+        slow = ill.BlockReader.index_blocks( 'mixed.txt', left='🔥', right='🧯' )
+    finally:
+        illiterally.block.demojize = demojize
+    assert list(fast) == ['already-an-alias','inner-waving-hand-medium-skin-tone','unicode-name']
+    assert fast == slow
+
+@run_in_temp_directory()
+def test_deep_nesting( test_dir: str=None ):
+    depth = sys.getrecursionlimit() + 100
+    with open( 'deep.txt', 'w' ) as f:
+        f.writelines( f'<<<: Level {i}\n' for i in range(depth) )
+        f.writelines( ':>>>\n' for i in range(depth) )
+
+    blocks = ill.BlockReader.index_blocks( 'deep.txt', left='<<<:', right=':>>>' )
+    assert len(blocks) == depth
+    assert list(blocks)[0] == f'level-{depth-1}'
+    assert blocks['level-0'].nested == ['level-1']
+    assert len( blocks[f'level-{depth-1}'].path ) == depth
+
+@run_in_temp_directory()
+def test_compact_blocks( test_dir: str=None ):
+    with open( 'family.txt', 'w' ) as f:
+        f.write( '<<<: Outer\na\n<<<: Inner\nb\n<<<: Innermost\nc\n:>>>\n:>>>\n:>>>\n' )
+
+    blocks = ill.BlockReader.index_blocks( 'family.txt', left='<<<:', right=':>>>' )
+    assert not hasattr( blocks['inner'], '__dict__' )
+    assert blocks['innermost'].filename is blocks['outer'].filename
+    assert blocks['innermost'].path == ['outer','inner','innermost']
+    assert blocks['inner'].parent == 'outer' and blocks['inner'].nested == ['innermost']
+
+    # renaming a block is seen by the rest of its family
+    renamed = ill.BlockReader.rename_blocks( blocks, set(['inner']) )
+    assert list(renamed) == ['innermost','family-txt-inner','outer']
+    assert renamed['innermost'].path == ['outer','family-txt-inner','innermost']
+    assert renamed['outer'].nested == ['family-txt-inner']
+
+    copied = pickle.loads( pickle.dumps( renamed ) )
+    assert copied == renamed
+    assert copied['innermost'].family is copied['outer'].family
+    assert copied['innermost'].text == 'c\n'
+
+def test_link_table():
+    outputs = [ '/docs/index.md', '/docs/api/block.md', '/docs/api/state.md' ]
+    blocks = [ ill.Block( 'Block', '/src/block.py', 3, slug='block', rendered_into=outputs[1] ),
+               ill.Block( 'State', '/src/pkg/state.py', 7, slug='state', rendered_into=outputs[2] ),
+               ill.Block( 'Unused', '/src/unused.py', 1, slug='unused' ) ]
+
+    expected = [ (blk.ref(targ), blk.source_path(targ)) for blk in blocks for targ in outputs ]
+    links = ill.LinkTable()
+    for blk in blocks:
+        blk.links = links
+    assert [ (blk.ref(targ), blk.source_path(targ)) for blk in blocks for targ in outputs ] == expected
+    assert blocks[1].ref( outputs[0] ) == 'api/state.md'
+    assert blocks[0].source_path( outputs[1] ) == '../../src/block.py'
+    assert blocks[0].ref( outputs[1] ) == '' and blocks[2].ref( outputs[0] ) == 'INVALID'
+
+    # outputs in the same directory share entries
+    assert ('/docs/api','/src/block.py') in links.links and ('/docs/api/state.md','/src/block.py') not in links.links
+
+    # the table is shared, not copied, when blocks are sent to workers
+    copied = pickle.loads( pickle.dumps( blocks ) )
+    assert copied[0].links is copied[1].links
+
+if __name__ == '__main__':
+    test_iter_blocks()
+    test_block_spans()
+    test_demojize_fast_path()
+    test_deep_nesting()
+    test_compact_blocks()
+    test_link_table()
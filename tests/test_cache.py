@@ -0,0 +1,175 @@
+import os
+import glob
+import shutil
+import illiterally as ill
+
+from utils import run_in_temp_directory, test_data_dir
+
+def make_state( source_dir: str, output_dir: str, jobs: int=1 ):
+    return ill.State(
+        source_files = sorted( glob.glob( os.path.join( source_dir, 'source_files/source*.txt' ) ) ),
+        template_files = glob.glob( os.path.join( test_data_dir(), 'template_files/output*.txt' ) ),
+        block_template = 'block.txt',
+        output_dir = output_dir,
+        cache = True,
+        jobs = jobs
+    )
+
+@run_in_temp_directory()
+def test_index_cache( test_dir: str=None ):
+    shutil.copytree( os.path.join( test_data_dir(), 'source_files' ), os.path.join( test_dir, 'source_files' ) )
+
+    S = make_state( test_dir, os.path.join( test_dir, 'output' ) )
+    blocks,_ = S.parse_blocks()
+    assert S.index_cache.misses == 2 and S.index_cache.hits == 0
+    assert os.path.exists( os.path.join( test_dir, 'output', '.illiterally', 'index.json' ) )
+
+    S = make_state( test_dir, os.path.join( test_dir, 'output' ) )
+    cached,_ = S.parse_blocks()
+    assert S.index_cache.misses == 0 and S.index_cache.hits == 2
+    assert cached == blocks
+
+    # touching a file without changing it still hits via the content hash
+    source1 = os.path.join( test_dir, 'source_files', 'source1.txt' )
+    os.utime( source1, ns=(0,0) )
+    S = make_state( test_dir, os.path.join( test_dir, 'output' ) )
+    S.parse_blocks()
+    assert S.index_cache.misses == 0 and S.index_cache.hits == 2
+
+    with open( source1, 'a' ) as f:
+        f.write( '\n🔥 Block 7\nThis is block 7\n🧯\n' )
+    S = make_state( test_dir, os.path.join( test_dir, 'output' ) )
+    blocks,_ = S.parse_blocks()
+    assert S.index_cache.misses == 1 and S.index_cache.hits == 1
+    assert 'block-7' in blocks
+
+    # an edit landing while the file is parsed must not be cached as parsed
+    index_blocks = ill.BlockReader.index_blocks
+    def racing_index_blocks( filename, *args, **kwargs ):
+        with open( source1, 'a' ) as f:
+            f.write( '\n🔥 Block 8\nThis is block 8\n🧯\n' )
+        return index_blocks( filename, *args, **kwargs )
+    with open( source1, 'a' ) as f:
+        f.write( '\n' )
+    ill.BlockReader.index_blocks = staticmethod( racing_index_blocks )
+    try:
+        S = make_state( test_dir, os.path.join( test_dir, 'output' ) )
+        blocks,_ = S.parse_blocks()
+    finally:
+        ill.BlockReader.index_blocks = staticmethod( index_blocks )
+    assert 'block-8' not in blocks
+    S = make_state( test_dir, os.path.join( test_dir, 'output' ) )
+    blocks,_ = S.parse_blocks()
+    assert S.index_cache.misses == 1 and S.index_cache.hits == 1
+    assert 'block-8' in blocks
+
+@run_in_temp_directory()
+def test_template_cache( test_dir: str=None ):
+    S = ill.State(
+        source_files = glob.glob( os.path.join( test_data_dir(), 'source_files/source*.txt' ) ),
+        template_files = glob.glob( os.path.join( test_data_dir(), 'template_files/output*.txt' ) ),
+        block_template = 'block.txt',
+        output_dir = os.path.join( test_dir, 'output' ),
+        cache = True
+    )
+
+    # each template is compiled once for both the activate and render passes
+    compiled = []
+    compile = S.env.compile
+    S.env.compile = lambda source, name=None, *args, **kwargs: compiled.append( name ) or compile( source, name, *args, **kwargs )
+
+    blocks,_ = S.parse_blocks()
+    S.activate_blocks_from_templates( blocks )
+    S.render_blocks_from_templates( blocks )
+    assert sorted( n for n in compiled if n in S.template_files ) == sorted( S.template_files )
+
+    # output templates, the block template and its macros
+    assert len( os.listdir( os.path.join( test_dir, 'output', '.illiterally', 'jinja' ) ) ) == len( S.template_files ) + 2
+
+@run_in_temp_directory()
+def test_fragment_cache( test_dir: str=None ):
+    def render( jobs: int=1, max_disk: int=None ):
+        S = make_state( test_data_dir(), os.path.join( test_dir, 'output' ), jobs )
+        if max_disk is not None:
+            S.fragments.max_disk = max_disk
+        blocks,_ = S.parse_blocks()
+        S.activate_blocks_from_templates( blocks )
+        S.render_blocks_from_templates( blocks )
+        return S, { f: open(f).read() for f in S.output_files }
+
+    S,outputs = render()
+    assert S.fragments.hits == 0 and S.fragments.misses == 4
+
+    # remove the outputs, but not the cache, to force a full re-render
+    for f in outputs:
+        os.remove( f )
+    S,cached = render()
+    assert S.fragments.hits == 4 and S.fragments.misses == 0
+    assert cached == outputs
+
+    # hits in render workers are counted as well
+    for f in outputs:
+        os.remove( f )
+    S,cached = render( jobs=2 )
+    assert S.stats.counters['fragment_cache'] == dict( hits=4, misses=0 )
+    assert cached == outputs
+
+    # fragments written by render workers are evicted by the parent
+    shutil.rmtree( os.path.join( test_dir, 'output' ) )
+    S,cached = render( jobs=2, max_disk=0 )
+    assert S.stats.counters['fragment_cache'] == dict( hits=0, misses=4 )
+    assert cached == outputs
+    fragments_dir = os.path.join( test_dir, 'output', '.illiterally', 'fragments' )
+    assert [ f for _,_,files in os.walk( fragments_dir ) for f in files ] == []
+
+@run_in_temp_directory()
+def test_include_cache( test_dir: str=None ):
+    for name,text in [('a.txt','a'*10),('b.txt','b'*10),('c.txt','c'*10)]:
+        with open( name, 'w' ) as f:
+            f.write( text )
+
+    includes = ill.IncludeCache( max_memory=25 )
+    assert includes.read( 'a.txt' ) == 'a'*10 and includes.read( './a.txt' ) == 'a'*10
+    assert includes.hits == 1 and includes.misses == 1
+
+    # least recently used entries are evicted beyond max_memory
+    includes.read( 'b.txt' )
+    includes.read( 'a.txt' )
+    includes.read( 'c.txt' )
+    assert list( includes.memory ) == [ os.path.join( test_dir, f ) for f in ['a.txt','c.txt'] ]
+
+    # changed files are re-read
+    with open( 'a.txt', 'w' ) as f:
+        f.write( 'changed' )
+    os.utime( 'a.txt', ns=(0,0) )
+    assert includes.read( 'a.txt' ) == 'changed'
+    assert includes.hits == 2 and includes.misses == 4
+
+@run_in_temp_directory()
+def test_include_stats( test_dir: str=None ):
+    with open( 'table.txt', 'w' ) as f:
+        f.write( 'shared table\n' )
+    for name in ['one.md','two.md']:
+        with open( name, 'w' ) as f:
+            f.write( "{{ include_file('table.txt') }}{{ include_file('table.txt') }}\n" )
+
+    stats = ill.Stats()
+    S = ill.State(
+        source_files = sorted( glob.glob( os.path.join( test_data_dir(), 'source_files/source*.txt' ) ) ),
+        template_files = ['one.md','two.md'],
+        block_template = 'block.txt',
+        output_dir = 'output',
+        cache = True,
+        stats = stats
+    )
+    ill.build( S )
+    assert stats.counters['include_cache'] == dict( hits=3, misses=1 )
+    assert open( 'output/one.md' ).read() == 'shared table\nshared table\n'
+    assert os.path.abspath('table.txt') in S.deps.outputs[ os.path.abspath('output/two.md') ]['files']
+
+if __name__ == '__main__':
+    test_index_cache()
+    test_template_cache()
+    test_fragment_cache()
+    test_include_cache()
+    test_include_stats()
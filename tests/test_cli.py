@@ -1,5 +1,6 @@
 import os
 import glob
+import json
 
 from illiterally import *
 
@@ -16,5 +17,62 @@ def test_txt( test_dir:str=None ):
     ])
     assert ret == 0
 
+@run_in_temp_directory()
+def test_txt_parallel( test_dir:str=None ):
+    outputs = {}
+    for jobs in ['1','2']:
+        ret = illiterally_cli([ 'dummy',
+            '--source',   *glob.glob( os.path.join( test_data_dir(), 'source_files/source*.txt') ),
+            '--template', *glob.glob( os.path.join( test_data_dir(), 'template_files/output*.txt') ),
+            '--template-prefix', test_data_dir(),
+            '--block', 'block.txt',
+            '--output-dir', os.path.join( test_dir, jobs ),
+            '--jobs', jobs
+        ])
+        assert ret == 0
+        outputs[jobs] = { f: open( os.path.join( test_dir, jobs, 'template_files', f ) ).read() for f in ['output1.txt','output2.txt'] }
+    assert outputs['1'] == outputs['2']
+
+@run_in_temp_directory()
+def test_txt_stats( test_dir:str=None ):
+    source_files = glob.glob( os.path.join( test_data_dir(), 'source_files/source*.txt') )
+    template_files = glob.glob( os.path.join( test_data_dir(), 'template_files/output*.txt') )
+    ret = illiterally_cli([ 'dummy',
+        '--source',   *source_files,
+        '--template', *template_files,
+        '--template-prefix', test_data_dir(),
+        '--block', 'block.txt',
+        '--output-dir', test_dir,
+        '--stats', os.path.join( test_dir, 'stats.json' ),
+        '--profile', os.path.join( test_dir, 'profile.prof' )
+    ])
+    assert ret == 0
+    with open( os.path.join( test_dir, 'stats.json' ) ) as f:
+        stats = json.load( f )
+    for phase in ['setup','parse','activate','render','write']:
+        assert stats['phases'][phase]['wall'] >= 0.0
+    assert set( stats['source_files'] ) == set( source_files )
+    assert set( stats['templates'] ) == set( template_files )
+    assert stats['counters']['outputs'] == dict( rendered=len(template_files), up_to_date=0, updated=len(template_files) )
+    assert os.path.exists( os.path.join( test_dir, 'profile.prof' ) )
+
+@run_in_temp_directory()
+def test_txt_index( test_dir:str=None ):
+    source_files = glob.glob( os.path.join( test_data_dir(), 'source_files/source*.txt') )
+    template_files = sorted( glob.glob( os.path.join( test_data_dir(), 'template_files/output*.txt') ) )
+    common = [ '--template-prefix', test_data_dir(), '--block', 'block.txt' ]
+    assert illiterally_cli([ 'dummy', '--source', *source_files, '--template', *template_files, '--output-dir', 'full', *common ]) == 0
+    assert illiterally_cli([ 'dummy', 'index', '--source', *source_files, '--template', *template_files, '--index', 'index.json.gz', '--output-dir', 'sharded', *common ]) == 0
+
+    # each shard renders one template against the shared index
+    for template_file in template_files:
+        assert illiterally_cli([ 'dummy', '--index', 'index.json.gz', '--template', template_file, '--output-dir', 'sharded', *common ]) == 0
+    for template_file in template_files:
+        output_file = os.path.join( 'template_files', os.path.basename(template_file) )
+        assert open( os.path.join( 'sharded', output_file ) ).read() == open( os.path.join( 'full', output_file ) ).read()
+
 if __name__ == '__main__':
-    test_txt()
\ No newline at end of file
+    test_txt()
+    test_txt_parallel()
+    test_txt_stats()
+    test_txt_index()
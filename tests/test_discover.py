@@ -0,0 +1,134 @@
+import os
+import glob
+
+from illiterally import *
+from illiterally.discover import IgnoreRules
+
+from utils import run_in_temp_directory, test_data_dir
+
+def write( path: str, text: str='' ):
+    os.makedirs( os.path.dirname(path) or '.', exist_ok=True )
+    with open( path, 'w' ) as f:
+        f.write( text )
+
+def test_ignore_rules():
+    rules = IgnoreRules().extend([ '# comment', '*.log', 'build/', '/top.txt', 'docs/**/*.md', '!keep.log' ])
+    assert rules.matches( 'a/b/debug.log', False )
+    assert not rules.matches( 'a/b/keep.log', False )
+    assert rules.matches( 'a/build', True )
+    assert not rules.matches( 'a/build', False )
+    assert rules.matches( 'top.txt', False )
+    assert not rules.matches( 'a/top.txt', False )
+    assert rules.matches( 'docs/x/y/z.md', False )
+    assert rules.matches( 'docs/z.md', False )
+    assert not rules.matches( 'src/z.md', False )
+
+    nested = rules.extend( ['*.py'], 'src' )
+    assert nested.matches( 'src/a/b.py', False )
+    assert not nested.matches( 'b.py', False )
+
+@run_in_temp_directory()
+def test_discover_sources( test_dir: str=None ):
+    write( 'tree/a.py', 'x' )
+    write( 'tree/b.cpp', 'x' )
+    write( 'tree/big.py', 'x'*1000 )
+    write( 'tree/notes.txt' )
+    write( 'tree/sub/c.py' )
+    write( 'tree/sub/deeper/d.py' )
+    write( 'tree/generated/e.py' )
+    write( 'tree/vendor/f.py' )
+    write( 'tree/.git/g.py' )
+    write( 'tree/.gitignore', 'generated/\n' )
+    write( 'tree/sub/.illiterallyignore', 'deeper/\n' )
+    write( 'explicit.txt' )
+
+    found = discover_sources( ['tree'], extensions=['py','.cpp'], exclude=['vendor/'], max_size=100 )
+    assert found == [ os.path.join( test_dir, f ) for f in ['tree/a.py','tree/b.cpp','tree/sub/c.py'] ]
+
+    found = discover_sources( ['tree'], include=['sub/**'], ignore_files=[] )
+    assert found == [ os.path.join( test_dir, f ) for f in ['tree/sub/.illiterallyignore','tree/sub/c.py','tree/sub/deeper/d.py'] ]
+
+    # explicit files are kept as is, in order, and globs are expanded
+    found = discover_sources( ['explicit.txt', 'tree/*.py', 'tree/a.py'], max_size=100 )
+    assert found == [ os.path.join( test_dir, f ) for f in ['explicit.txt','tree/a.py'] ]
+
+@run_in_temp_directory()
+def test_discover_build( test_dir: str=None ):
+    source_dir = os.path.join( test_data_dir(), 'source_files' )
+    template_files = glob.glob( os.path.join( test_data_dir(), 'template_files/output*.txt') )
+    outputs = {}
+    for name,sources in [('files',glob.glob( os.path.join( source_dir, 'source*.txt' ) )),('dir',[source_dir])]:
+        ret = illiterally_cli([ 'dummy',
+            '--source',   *sources,
+            '--extension', '.txt',
+            '--template', *template_files,
+            '--template-prefix', test_data_dir(),
+            '--block', 'block.txt',
+            '--output-dir', os.path.join( test_dir, name )
+        ])
+        assert ret == 0
+        outputs[name] = { f: open( os.path.join( test_dir, name, 'template_files', f ) ).read() for f in ['output1.txt','output2.txt'] }
+    assert outputs['files'] == outputs['dir']
+
+@run_in_temp_directory()
+def test_discover_rescan( test_dir: str=None ):
+    write( 'src/one.txt', '🔥 One\none\n🧯\n' )
+    write( 'src/sub/ignored.md' )
+    S = State(
+        source_files = ['src'],
+        template_files = glob.glob( os.path.join( test_data_dir(), 'template_files/output*.txt' ) ),
+        block_template = 'block.txt',
+        output_dir = 'output',
+        extensions = ['.txt']
+    )
+    assert S.source_dirs == [ os.path.join( test_dir, 'src' ), os.path.join( test_dir, 'src', 'sub' ) ]
+    blocks,_ = S.parse_blocks()
+    assert list(blocks) == ['one']
+
+    # later builds of the same state see files added since
+    write( 'src/sub/two.txt', '🔥 Two\ntwo\n🧯\n' )
+    blocks,_ = S.parse_blocks()
+    assert sorted(blocks) == ['one','two']
+    assert S.source_files == [ os.path.join( test_dir, f ) for f in ['src/one.txt','src/sub/two.txt'] ]
+
+@run_in_temp_directory()
+def test_discover_skips_outputs( test_dir: str=None ):
+    # the outputs, templates and cache of a build inside the scanned tree
+    # are not sources of the next build
+    write( 'src.txt', '🔥 One\none\n🧯\n' )
+    write( 'doc.md', "{{ render_block('one') }}\n" )
+    write( 'block.md', '{{ block(slug).left }} {{ block(slug).name }}\n{{ block(slug).text }}{{ block(slug).right }}\n' )
+    for _ in range(2):
+        ret = illiterally_cli([ 'dummy', '-s', '.', '-o', 'doc.md', '-b', 'block.md', '--cache' ])
+        assert ret == 0
+        assert open( 'output/doc.md' ).read() == '🔥 One\none\n🧯'
+
+    found = discover_sources( ['.'], skip=['output','doc.md','block.md'] )
+    assert found == [ os.path.join( test_dir, 'src.txt' ) ]
+    found = discover_sources( ['**/*'], skip=['output','doc.md','block.md'] )
+    assert found == [ os.path.join( test_dir, 'src.txt' ) ]
+
+@run_in_temp_directory()
+def test_discover_binary( test_dir: str=None ):
+    write( 'src/one.txt', '🔥 One\none\n🧯\n' )
+    with open( 'src/image.png', 'wb' ) as f:
+        f.write( b'\x89PNG\r\n\x1a\n\x00\x80\xff' )
+    for cache in [False,True,True]:
+        S = State(
+            source_files = ['src'],
+            template_files = glob.glob( os.path.join( test_data_dir(), 'template_files/output*.txt' ) ),
+            block_template = 'block.txt',
+            output_dir = 'output',
+            cache = cache
+        )
+        blocks,_ = S.parse_blocks()
+        assert list(blocks) == ['one']
+        assert S.log.warnings == 1
+
+if __name__ == '__main__':
+    test_ignore_rules()
+    test_discover_sources()
+    test_discover_build()
+    test_discover_rescan()
+    test_discover_skips_outputs()
+    test_discover_binary()
@@ -0,0 +1,26 @@
+import os
+import sys
+import subprocess
+
+import emoji
+
+from illiterally.delimiters import DELIMITER_ALIASES, emojize, demojize
+
+def test_lazy_imports():
+    code = 'import sys, illiterally.cli; print(sorted( m for m in ["jinja2","emoji","slugify"] if m in sys.modules ))'
+    root = os.path.dirname( os.path.dirname( os.path.abspath(__file__) ) )
+    out = subprocess.run( [sys.executable, '-c', code], cwd=root, capture_output=True, text=True, check=True ).stdout
+    assert out.strip() == '[]'
+
+def test_delimiter_aliases():
+    for emo,alias in DELIMITER_ALIASES.items():
+        assert emoji.demojize( emo ) == alias
+        assert emoji.emojize( alias ) == emo
+        assert demojize( emo ) == alias and emojize( alias ) == emo
+    for text in ['<<<:', ':>>>', '\U0001F600', ':grinning_face:', 'x \U0001F525 y']:
+        assert emojize( text ) == emoji.emojize( text )
+        assert demojize( text ) == emoji.demojize( text )
+
+if __name__ == '__main__':
+    test_lazy_imports()
+    test_delimiter_aliases()
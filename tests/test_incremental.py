@@ -0,0 +1,99 @@
+import os
+import sys
+import glob
+import json
+import shutil
+import illiterally as ill
+
+from utils import run_in_temp_directory, test_data_dir
+
+def build( test_dir: str, stats_file: str=None, block_template: str='block.txt' ):
+    return ill.illiterally(
+        source_files = sorted( glob.glob( os.path.join( test_dir, 'source_files/source*.txt' ) ) ),
+        template_files = sorted( glob.glob( os.path.join( test_dir, 'template_files/output*.txt' ) ) ),
+        template_prefix = test_dir,
+        block_template = block_template,
+        output_dir = os.path.join( test_dir, 'output' ),
+        cache = True,
+        stats_file = stats_file
+    )
+
+@run_in_temp_directory()
+def test_incremental( test_dir: str=None ):
+    for d in ['source_files','template_files']:
+        shutil.copytree( os.path.join( test_data_dir(), d ), os.path.join( test_dir, d ) )
+    output1 = os.path.join( test_dir, 'output', 'template_files', 'output1.txt' )
+    output2 = os.path.join( test_dir, 'output', 'template_files', 'output2.txt' )
+
+    assert build( test_dir ) == 0
+    for o in [output1,output2]:
+        os.utime( o, ns=(0,0) )
+
+    # nothing changed, nothing is rendered
+    assert build( test_dir ) == 0
+    assert os.stat( output1 ).st_mtime_ns == 0
+    assert os.stat( output2 ).st_mtime_ns == 0
+
+    # block-5 is only rendered into output1
+    source2 = os.path.join( test_dir, 'source_files', 'source2.txt' )
+    with open( source2 ) as f:
+        text = f.read()
+    with open( source2, 'w' ) as f:
+        f.write( text.replace( 'This is block 5', 'This is the new block 5' ) )
+    assert build( test_dir ) == 0
+    assert 'This is the new block 5' in open( output1 ).read()
+    assert os.stat( output2 ).st_mtime_ns == 0
+
+    # touching a template re-renders just that output, which is left
+    # alone since its contents didn't change
+    os.utime( os.path.join( test_dir, 'template_files', 'output2.txt' ) )
+    os.utime( output1, ns=(0,0) )
+    assert build( test_dir, 'stats.json' ) == 0
+    with open( 'stats.json' ) as f:
+        assert json.load( f )['counters']['outputs'] == dict( rendered=1, up_to_date=1, updated=0 )
+    assert os.stat( output1 ).st_mtime_ns == 0
+    assert os.stat( output2 ).st_mtime_ns == 0
+
+    # a changed template is written out
+    template2 = os.path.join( test_dir, 'template_files', 'output2.txt' )
+    with open( template2, 'a' ) as f:
+        f.write( 'One more line\n' )
+    assert build( test_dir ) == 0
+    assert 'One more line' in open( output2 ).read()
+    assert os.stat( output1 ).st_mtime_ns == 0
+    assert not os.path.exists( output2 + '.tmp' )
+
+    # switching block templates re-renders everything
+    assert build( test_dir, block_template='block.md' ) == 0
+    assert '```' in open( output1 ).read() and '```' in open( output2 ).read()
+
+@run_in_temp_directory()
+def test_watch_survives_errors( test_dir: str=None ):
+    for d in ['source_files','template_files']:
+        shutil.copytree( os.path.join( test_data_dir(), d ), os.path.join( test_dir, d ) )
+    with open( os.path.join( test_dir, 'template_files', 'output1.txt' ), 'a' ) as f:
+        f.write( '{{ unclosed\n' )
+    S = ill.State(
+        source_files = sorted( glob.glob( os.path.join( test_dir, 'source_files/source*.txt' ) ) ),
+        template_files = sorted( glob.glob( os.path.join( test_dir, 'template_files/output*.txt' ) ) ),
+        template_prefix = test_dir,
+        block_template = 'block.txt',
+        output_dir = os.path.join( test_dir, 'output' ),
+        cache = True
+    )
+
+    # the failed build is logged and the watcher goes on to wait for changes
+    def stop( seconds ):
+        raise KeyboardInterrupt
+    # the illiterally() function shadows its module in the package
+    time = sys.modules['illiterally.illiterally'].time
+    sleep,time.sleep = time.sleep,stop
+    try:
+        assert ill.watch_and_build( S ) == 1
+    finally:
+        time.sleep = sleep
+    assert S.log.errors == 1
+
+if __name__ == '__main__':
+    test_incremental()
+    test_watch_survives_errors()
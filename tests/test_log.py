@@ -0,0 +1,35 @@
+import os
+import illiterally as ill
+
+from utils import run_in_temp_directory
+
+def test_log_levels():
+    log = ill.Log( level=ill.WARNING, buffer_size=None )
+    log.info( 'hidden' )
+    log.debug( 'hidden' )
+    with log.indent():
+        log.warning( 'shown' )
+    log.error( 'shown' )
+    assert log.warnings == 1 and log.errors == 1
+    assert log.take() == '  [WARNING]:  shown\n [ERROR]:  shown\n'
+    assert log.take() == ''
+
+    log = ill.Log( level=ill.DEBUG, buffer_size=None )
+    log.debug( 'shown' )
+    assert log.take() == ' shown\n'
+
+@run_in_temp_directory()
+def test_log_close( test_dir: str=None ):
+    # buffered output is only written on flush or close, nothing is
+    # left registered to run at exit
+    log = ill.Log( os.path.join( test_dir, 'log.txt' ) )
+    log.info( 'buffered' )
+    assert open( os.path.join( test_dir, 'log.txt' ) ).read() == ''
+    file = log.file
+    log.close()
+    assert file.closed and log.file is None
+    assert open( os.path.join( test_dir, 'log.txt' ) ).read() == ' buffered\n'
+
+if __name__ == '__main__':
+    test_log_levels()
+    test_log_close()
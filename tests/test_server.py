@@ -0,0 +1,49 @@
+import os
+import glob
+import time
+import threading
+
+from illiterally import *
+
+from utils import run_in_temp_directory, test_data_dir
+
+@run_in_temp_directory()
+def test_server( test_dir:str=None ):
+    template_files = sorted( glob.glob( os.path.join( test_data_dir(), 'template_files/output*.txt') ) )
+    S = State(
+        source_files = glob.glob( os.path.join( test_data_dir(), 'source_files/source*.txt') ),
+        template_files = template_files,
+        block_template = 'block.txt',
+        template_prefix = test_data_dir(),
+        output_dir = os.path.join( test_dir, 'output' ),
+        cache = True
+    )
+    socket_path = os.path.join( test_dir, 'server.sock' )
+    thread = threading.Thread( target=serve, args=(S,socket_path), daemon=True )
+    thread.start()
+    while not os.path.exists( socket_path ):
+        assert thread.is_alive()
+        time.sleep( 0.01 )
+
+    output_file = os.path.join( test_dir, 'output', 'template_files', 'output1.txt' )
+    expected = open( output_file ).read()
+    os.remove( output_file )
+
+    assert client( socket_path, 'render', template=template_files[0] ) == 0
+    assert open( output_file ).read() == expected
+    assert client( socket_path, 'render', template='missing.txt' ) == 1
+    assert client( socket_path, 'build' ) == 0
+
+    # relative templates are resolved by the client
+    os.remove( output_file )
+    os.chdir( os.path.dirname( template_files[0] ) )
+    assert illiterally_cli([ 'dummy', 'client', 'render', os.path.basename( template_files[0] ), '--socket', socket_path ]) == 0
+    os.chdir( test_dir )
+    assert open( output_file ).read() == expected
+    assert illiterally_cli([ 'dummy', 'client', 'build', '--socket', socket_path ]) == 0
+    assert illiterally_cli([ 'dummy', 'client', 'shutdown', '--socket', socket_path ]) == 0
+    thread.join()
+    assert not os.path.exists( socket_path )
+
+if __name__ == '__main__':
+    test_server()
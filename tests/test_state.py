@@ -2,7 +2,7 @@ import os
 import glob
 import illiterally as ill
 
-from utils import test_data_dir
+from utils import run_in_temp_directory, test_data_dir
 
 def test_state_paths():
     S = ill.State( 
@@ -24,6 +24,67 @@ def test_state_paths():
     for t,o in zip( S.template_files, S.output_files ):
         assert os.path.abspath( os.path.join( S.output_dir, os.path.relpath( t, S.template_prefix ) ) ) == o
 
+@run_in_temp_directory()
+def test_state_deduplicate( test_dir: str=None ):
+    for name,body in [('one.txt','🔥 Setup\nx\n🔥 Helper\ny\n🧯\n🧯\n'),('two.txt','🔥 Setup\nq\n🔥 Inner\nw\n🧯\n🧯\n')]:
+        with open( os.path.join( test_dir, name ), 'w' ) as f:
+            f.write( body )
+
+    S = ill.State(
+        source_files = [ os.path.join( test_dir, 'one.txt' ), os.path.join( test_dir, 'two.txt' ) ],
+        template_files = glob.glob( os.path.join( test_data_dir(), 'template_files/output*.txt' ) ),
+        block_template='block.md',
+        output_dir='output'
+    )
+    blocks,duplicates = S.parse_blocks()
+    assert len(duplicates) == 0
+    assert list(blocks.keys()) == ['helper','one-txt-setup','inner','two-txt-setup']
+    assert blocks['one-txt-setup'].nested == ['helper']
+    assert blocks['one-txt-setup'].slug_base == 'setup'
+    assert blocks['helper'].parent == 'one-txt-setup'
+    assert blocks['inner'].path == ['two-txt-setup','inner']
+
+    # a slug repeated within one file and colliding with another file is
+    # renamed everywhere, including the occurrence overwritten in the index
+    with open( os.path.join( test_dir, 'one.txt' ), 'w' ) as f:
+        f.write( '🔥 Outer\nx\n🔥 Helper\ny\n🧯\n🔥 Helper\nz\n🧯\n🧯\n' )
+    with open( os.path.join( test_dir, 'two.txt' ), 'w' ) as f:
+        f.write( '🔥 Helper\nq\n🧯\n' )
+    blocks,duplicates = S.parse_blocks()
+    assert list(blocks.keys()) == ['one-txt-helper','outer','two-txt-helper']
+    assert blocks['outer'].nested == ['one-txt-helper','one-txt-helper']
+    assert blocks['one-txt-helper'].text == 'z\n'
+
+def test_state_parallel_parse():
+    def parse( jobs: int ):
+        S = ill.State(
+            source_files = glob.glob( os.path.join( test_data_dir(), 'source_files/source*.txt' ) ),
+            template_files = glob.glob( os.path.join( test_data_dir(), 'template_files/output*.txt' ) ),
+            block_template='block.md',
+            output_dir='blah/output_test',
+            jobs=jobs
+        )
+        return S.parse_blocks()
+
+    serial = parse( 1 )
+    parallel = parse( 2 )
+    assert list(serial[0].keys()) == list(parallel[0].keys())
+    assert serial == parallel
+
+@run_in_temp_directory()
+def test_state_prefilter( test_dir: str=None ):
+    for name,body in [('plain.txt','no blocks here\n'),('text.txt','<<<: Setup\nx\n:>>>\n'),('emoji.txt','caf\u00e9 \U0001F525 Setup\nx\n\U0001F9EF\n')]:
+        with open( os.path.join( test_dir, name ), 'w', encoding='utf-8' ) as f:
+            f.write( body )
+
+    assert ill.BlockReader.index_blocks( 'plain.txt' ) is None
+    assert ill.BlockReader.index_blocks( 'plain.txt', left='<<<:', right=':>>>' ) == {}
+    assert list( ill.BlockReader.index_blocks( 'text.txt', left='<<<:', right=':>>>' ).keys() ) == ['setup']
+    assert ill.BlockReader.detect_left_right( 'emoji.txt' ) == ('\U0001F525','\U0001F9EF')
+    assert ill.BlockReader.index_blocks( 'emoji.txt' )['setup'].text == 'x\n'
+
 if __name__ == '__main__':
     test_state_paths()
-
+    test_state_deduplicate()
+    test_state_parallel_parse()
+    test_state_prefilter()